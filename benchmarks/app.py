@@ -0,0 +1,115 @@
+"""
+Sample application of the load tests, exercising the buffered, streaming,
+static and cached paths of Flask-Compress.
+
+The `COMPRESS_*` options are read from the `FLASK_COMPRESS_BENCH_CONFIG`
+environment variable, as a JSON object, so that the same application can be
+served with every configuration of a run::
+
+    $ FLASK_COMPRESS_BENCH_CONFIG='{"COMPRESS_ZSTD_LEVEL": 1}' \\
+        gunicorn --workers 2 --threads 4 'benchmarks.app:create_app()'
+"""
+
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import random
+import shutil
+import tempfile
+from collections.abc import Iterator
+
+from flask import Flask, Response, request
+
+from flask_compress import Compress, DictCache
+
+CONFIG_VARIABLE = "FLASK_COMPRESS_BENCH_CONFIG"
+
+_WORDS = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima "
+    "mike november oscar papa quebec romeo sierra tango uniform victor"
+).split()
+
+
+def _html(rows: int, seed: int) -> str:
+    """Render an HTML table, similar to a server-side rendered page."""
+    rng = random.Random(seed)
+    lines = ["<!doctype html><html><body><table>"]
+    for i in range(rows):
+        words = " ".join(rng.choices(_WORDS, k=8))
+        lines.append(
+            f'<tr class="row"><td>{i}</td><td>{words}</td>'
+            f"<td>{rng.randrange(10**6)}</td></tr>"
+        )
+    lines.append("</table></body></html>")
+    return "\n".join(lines)
+
+
+def _javascript(functions: int) -> str:
+    rng = random.Random(0)
+    return "\n".join(
+        f"function {rng.choice(_WORDS)}{i}(a, b) {{ return a * {i} + b; }}"
+        for i in range(functions)
+    )
+
+
+class CachedPathsCache(DictCache):
+    """In-memory cache of the responses under `/cached/` only."""
+
+    def get(self, key: str) -> bytes | None:
+        return super().get(key) if "/cached/" in key else None
+
+    def set(self, key: str, value: bytes) -> None:
+        if "/cached/" in key:
+            super().set(key, value)
+
+
+def create_app(config: dict[str, object] | None = None) -> Flask:
+    """
+    Create the sample application.
+
+    :param config: `COMPRESS_*` options, defaults to the ones of the
+        `FLASK_COMPRESS_BENCH_CONFIG` environment variable
+    """
+    if config is None:
+        config = json.loads(os.environ.get(CONFIG_VARIABLE) or "{}")
+
+    # Generated once per worker, so that the repository does not hold them
+    static_folder = tempfile.mkdtemp(prefix="flask-compress-bench-")
+    atexit.register(functools.partial(shutil.rmtree, static_folder, True))
+    with open(os.path.join(static_folder, "app.js"), "w") as f:
+        f.write(_javascript(5000))
+
+    app = Flask(__name__, static_folder=static_folder, static_url_path="/static")
+    app.config["COMPRESS_CACHE_KEY"] = lambda request: request.path
+    app.config["COMPRESS_CACHE_BACKEND"] = CachedPathsCache
+    app.config.update(config)
+    Compress(app)
+
+    # Rendered ahead, so that the measures are not dominated by templating
+    pages = [_html(2000, seed) for seed in range(16)]
+
+    @app.route("/buffered/")
+    def buffered() -> str:
+        # Dynamic content, not cached
+        return random.choice(pages)
+
+    @app.route("/cached/")
+    def cached() -> str:
+        return pages[0]
+
+    @app.route("/stream/")
+    def stream() -> Response:
+        rows = int(request.args.get("rows", 2000))
+
+        def _generate() -> Iterator[str]:
+            rng = random.Random(1)
+            for i in range(rows):
+                words = " ".join(rng.choices(_WORDS, k=8))
+                yield f"<p>{i} {words}</p>\n"
+
+        return Response(_generate(), mimetype="text/html")
+
+    return app
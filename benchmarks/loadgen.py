@@ -0,0 +1,222 @@
+"""
+Closed-loop HTTP load generator.
+
+Every connection sends its next request as soon as the previous response is
+read, on a persistent connection. The connections are spread over several
+processes, so that the load generator is not limited by a single GIL::
+
+    $ python -m benchmarks.loadgen http://127.0.0.1:8000 \\
+        --mix /buffered/=4,/cached/=3 --connections 16 --duration 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import multiprocessing
+import random
+import threading
+import time
+import urllib.parse
+from collections.abc import Mapping
+from typing import Any, NamedTuple
+
+ACCEPT_ENCODING = "gzip, deflate, br, zstd"
+
+
+class Result(NamedTuple):
+    """Measures of a load test."""
+
+    duration: float
+    # Latencies of the successful requests, in seconds, per path
+    latencies: dict[str, list[float]]
+    # Size of the response bodies, in bytes
+    received: int
+    errors: int
+
+    @property
+    def requests(self) -> int:
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.duration
+
+    def percentiles(
+        self, path: str | None = None, points: tuple[float, ...] = (50, 90, 99)
+    ) -> dict[str, float]:
+        """
+        Return the latency percentiles of `path`, or of all the paths, and the
+        maximum latency, in milliseconds.
+        """
+        if path is None:
+            latencies = sorted(x for xs in self.latencies.values() for x in xs)
+        else:
+            latencies = sorted(self.latencies.get(path, ()))
+        if not latencies:
+            return {}
+        result = {
+            f"p{point:g}": 1000
+            * latencies[min(len(latencies) - 1, int(len(latencies) * point / 100))]
+            for point in points
+        }
+        result["max"] = 1000 * latencies[-1]
+        return result
+
+
+def _connection_loop(
+    url: urllib.parse.SplitResult,
+    mix: Mapping[str, int],
+    headers: Mapping[str, str],
+    deadline: float,
+    seed: int,
+    result: dict[str, Any],
+) -> None:
+    rng = random.Random(seed)
+    paths = list(mix)
+    weights = list(mix.values())
+    latencies: dict[str, list[float]] = {path: [] for path in paths}
+    received = errors = 0
+    connection = http.client.HTTPConnection(url.hostname or "", url.port, timeout=30)
+    try:
+        while time.perf_counter() < deadline:
+            path = rng.choices(paths, weights)[0]
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=dict(headers))
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                continue
+            if response.status >= 400:
+                errors += 1
+                continue
+            latencies[path].append(time.perf_counter() - start)
+            received += len(body)
+    finally:
+        connection.close()
+    result.update(latencies=latencies, received=received, errors=errors)
+
+
+def _process(
+    args: tuple[str, Mapping[str, int], Mapping[str, str], float, int, int],
+) -> Result:
+    url, mix, headers, duration, connections, seed = args
+    parsed = urllib.parse.urlsplit(url)
+    start = time.perf_counter()
+    deadline = start + duration
+    results: list[dict[str, Any]] = [{} for _ in range(connections)]
+    threads = [
+        threading.Thread(
+            target=_connection_loop,
+            args=(parsed, mix, headers, deadline, seed + i, results[i]),
+        )
+        for i in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies: dict[str, list[float]] = {path: [] for path in mix}
+    for result in results:
+        for path, values in result["latencies"].items():
+            latencies[path].extend(values)
+    return Result(
+        duration=time.perf_counter() - start,
+        latencies=latencies,
+        received=sum(result["received"] for result in results),
+        errors=sum(result["errors"] for result in results),
+    )
+
+
+def run(
+    url: str,
+    mix: Mapping[str, int],
+    duration: float,
+    connections: int = 8,
+    processes: int = 2,
+    accept_encoding: str = ACCEPT_ENCODING,
+) -> Result:
+    """
+    Load `url` for `duration` seconds.
+
+    :param url: base URL of the server, e.g. `http://127.0.0.1:8000`
+    :param mix: weight of each path in the requests
+    :param connections: number of concurrent connections, in total
+    :param processes: number of processes sharing the connections
+    :param accept_encoding: `Accept-Encoding` header of the requests
+    """
+    headers = {"Accept-Encoding": accept_encoding}
+    processes = max(1, min(processes, connections))
+    jobs = [
+        (
+            url,
+            dict(mix),
+            headers,
+            duration,
+            connections // processes + (i < connections % processes),
+            1000 * i,
+        )
+        for i in range(processes)
+    ]
+    with multiprocessing.Pool(processes) as pool:
+        outputs = pool.map(_process, jobs)
+
+    latencies: dict[str, list[float]] = {path: [] for path in mix}
+    for output in outputs:
+        for path, values in output.latencies.items():
+            latencies[path].extend(values)
+    return Result(
+        # The processes run concurrently, until the last response is read
+        duration=max(output.duration for output in outputs),
+        latencies=latencies,
+        received=sum(output.received for output in outputs),
+        errors=sum(output.errors for output in outputs),
+    )
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """
+    Parse a mix of paths and weights.
+
+    >>> parse_mix("/buffered/=4,/cached/=3,/static/app.js")
+    {'/buffered/': 4, '/cached/': 3, '/static/app.js': 1}
+    """
+    mix = {}
+    for item in value.split(","):
+        path, _, weight = item.strip().partition("=")
+        mix[path] = int(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Closed-loop HTTP load generator.")
+    parser.add_argument("url", help="base URL of the server")
+    parser.add_argument("--mix", type=parse_mix, default={"/": 1})
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--accept-encoding", default=ACCEPT_ENCODING)
+    args = parser.parse_args()
+
+    result = run(
+        args.url,
+        args.mix,
+        args.duration,
+        args.connections,
+        args.processes,
+        args.accept_encoding,
+    )
+    print(f"{result.requests} requests, {result.errors} errors, {result.rps:.1f} RPS")
+    for path in (None, *args.mix):
+        latencies = ", ".join(
+            f"{name} {value:.1f} ms" for name, value in result.percentiles(path).items()
+        )
+        print(f"{path or 'all'}: {latencies}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Compare `COMPRESS_*` configurations under load.
+
+For each configuration, the sample application of :mod:`benchmarks.app` is
+served by gunicorn with several workers and threads, warmed up, then loaded
+by :mod:`benchmarks.loadgen`, while the CPU time and memory of the server
+processes are measured::
+
+    $ pip install -r benchmarks/requirements.txt
+    $ python -m benchmarks.run --duration 20 --only default,zstd-1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Any
+
+import psutil
+
+from benchmarks import loadgen
+from benchmarks.app import CONFIG_VARIABLE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIGS = os.path.join(ROOT, "benchmarks", "configs.json")
+MIX = "/buffered/=4,/cached/=3,/stream/=2,/static/app.js=1"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+class Server:
+    """gunicorn serving the sample application with a configuration."""
+
+    def __init__(
+        self, config: dict[str, Any], workers: int, threads: int, port: int
+    ) -> None:
+        self.url = f"http://127.0.0.1:{port}"
+        env = {**os.environ, CONFIG_VARIABLE: json.dumps(config)}
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                f"--workers={workers}",
+                f"--threads={threads}",
+                f"--bind=127.0.0.1:{port}",
+                "--log-level=warning",
+                "benchmarks.app:create_app()",
+            ],
+            cwd=ROOT,
+            env=env,
+        )
+
+    def wait(self, timeout: float = 30) -> None:
+        """Wait until the server answers."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(f"{self.url}/cached/", timeout=1):
+                    return
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("The server did not start.") from None
+                time.sleep(0.1)
+
+    def processes(self) -> list[psutil.Process]:
+        """Return the gunicorn master and workers."""
+        master = psutil.Process(self.process.pid)
+        return [master, *master.children(recursive=True)]
+
+    def stop(self) -> None:
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=30)
+
+
+class Monitor:
+    """Measure the CPU time and the peak memory of the server processes."""
+
+    def __init__(self, server: Server, interval: float = 0.1) -> None:
+        self.server = server
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample)
+
+    def _cpu_time(self) -> float:
+        total = 0.0
+        for process in self.server.processes():
+            times = process.cpu_times()
+            total += times.user + times.system
+        return total
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            rss = sum(p.memory_info().rss for p in self.server.processes())
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def __enter__(self) -> Monitor:
+        self._start_cpu = self._cpu_time()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.cpu_time = self._cpu_time() - self._start_cpu
+
+
+def measure(
+    name: str, config: dict[str, Any], args: argparse.Namespace
+) -> dict[str, Any]:
+    """Load the server with `config`, and return the measures."""
+    mix = loadgen.parse_mix(args.mix)
+    server = Server(config, args.workers, args.threads, _free_port())
+    try:
+        server.wait()
+        if args.warmup:
+            loadgen.run(server.url, mix, args.warmup, args.connections, args.processes)
+        with Monitor(server) as monitor:
+            result = loadgen.run(
+                server.url, mix, args.duration, args.connections, args.processes
+            )
+    finally:
+        server.stop()
+
+    requests = result.requests or 1
+    return {
+        "config": name,
+        "requests": result.requests,
+        "errors": result.errors,
+        "rps": result.rps,
+        "latency_ms": result.percentiles(),
+        "latency_ms_per_path": {path: result.percentiles(path) for path in mix},
+        "bytes_per_request": result.received / requests,
+        "cpu_s": monitor.cpu_time,
+        "cpu_ms_per_request": 1000 * monitor.cpu_time / requests,
+        "peak_rss_mib": monitor.peak_rss / 2**20,
+    }
+
+
+def _print_table(rows: list[dict[str, Any]]) -> None:
+    header = (
+        f"{'config':<16} {'RPS':>8} {'p50':>7} {'p90':>7} {'p99':>7} "
+        f"{'CPU/req':>8} {'RSS MiB':>8} {'KiB/req':>8} {'errors':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        latency = row["latency_ms"]
+        print(
+            f"{row['config']:<16} {row['rps']:>8.1f} "
+            f"{latency.get('p50', 0):>7.1f} {latency.get('p90', 0):>7.1f} "
+            f"{latency.get('p99', 0):>7.1f} {row['cpu_ms_per_request']:>8.2f} "
+            f"{row['peak_rss_mib']:>8.1f} {row['bytes_per_request'] / 1024:>8.1f} "
+            f"{row['errors']:>6}"
+        )
+    print("\nLatencies in milliseconds, CPU time of the server in ms per request.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare COMPRESS_* configurations under load."
+    )
+    parser.add_argument(
+        "--configs", default=CONFIGS, help="JSON file of the named configurations"
+    )
+    parser.add_argument("--only", help="comma-separated names of configurations")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--mix", default=MIX, help="paths and weights of the load")
+    parser.add_argument("--json", help="file to write the measures to")
+    args = parser.parse_args()
+
+    with open(args.configs) as f:
+        configs: dict[str, dict[str, Any]] = json.load(f)
+    if args.only:
+        configs = {name: configs[name] for name in args.only.split(",")}
+
+    rows = []
+    for name, config in configs.items():
+        print(f"Measuring {name}...", file=sys.stderr)
+        rows.append(measure(name, config, args))
+
+    _print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
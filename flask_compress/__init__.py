@@ -1,4 +1,14 @@
-from .flask_compress import CacheBackend, Compress, DictCache
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from .codecs import Codec, register_codec
+from .flask_compress import AsyncCacheBackend, CacheBackend, Compress, DictCache
+from .jsonstream import stream_json
+from .middleware import CompressMiddleware
+
+if TYPE_CHECKING:
+    from .cache import DiskCache, RedisCache, SharedMemoryCache
 
 # _version.py is generated by setuptools_scm when building the package.
 # It is not version-controlled, so if it is missing, this likely means that
@@ -9,4 +19,28 @@ except ImportError:
     __version__ = "0"
 
 
-__all__ = ("CacheBackend", "Compress", "DictCache")
+__all__ = (
+    "AsyncCacheBackend",
+    "CacheBackend",
+    "Codec",
+    "Compress",
+    "CompressMiddleware",
+    "DictCache",
+    "DiskCache",
+    "RedisCache",
+    "SharedMemoryCache",
+    "register_codec",
+    "stream_json",
+)
+
+# The cache backends import modules such as multiprocessing and socket, which
+# are only loaded once a backend is used.
+_CACHE_BACKENDS = {"DiskCache", "RedisCache", "SharedMemoryCache"}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _CACHE_BACKENDS:
+        from . import cache
+
+        return getattr(cache, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
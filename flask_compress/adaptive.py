@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+# Compression modes of an endpoint, from the most to the least expensive
+NORMAL, FAST, SKIP = 0, 1, 2
+MODES = ("normal", "fast", "skip")
+
+# Levels used in the `FAST` mode
+FAST_LEVELS = {
+    "COMPRESS_LEVEL": 1,
+    "COMPRESS_DEFLATE_LEVEL": 1,
+    "COMPRESS_ZSTD_LEVEL": 1,
+    "COMPRESS_BR_LEVEL": 0,
+}
+
+
+class _Record:
+    __slots__ = (
+        "mode",
+        "requests",
+        "samples",
+        "size_in",
+        "size_out",
+        "cpu_ms",
+        "ratio",
+        "benefit",
+    )
+
+    def __init__(self) -> None:
+        self.mode = NORMAL
+        self.requests = 0
+        self.ratio: float | None = None
+        self.benefit: float | None = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples = 0
+        self.size_in = 0
+        self.size_out = 0
+        self.cpu_ms = 0.0
+
+
+class AdaptiveTuner:
+    """
+    Learn, per endpoint, whether compressing responses is worth the CPU time.
+
+    Every compressed response is a sample of the bytes saved per CPU
+    millisecond. After `window` samples, an endpoint whose benefit is below
+    `threshold` is demoted from the `normal` mode to the `fast` mode, which
+    uses the cheapest levels, then to the `skip` mode, which does not compress
+    at all. Every `resample` requests, a demoted endpoint tries the mode above
+    its own, and is promoted back if the benefit is above `threshold`.
+
+    :param threshold: minimum benefit, in bytes saved per CPU millisecond
+    :param window: number of samples before a decision
+    :param resample: number of requests between two re-samples
+    """
+
+    def __init__(self, threshold: float, window: int, resample: int) -> None:
+        self.threshold = threshold
+        self.window = window
+        self.resample = resample
+        self._records: dict[str, _Record] = {}
+        self._lock = threading.Lock()
+
+    def choose(self, endpoint: str) -> int:
+        """Return the mode to use for the current request of `endpoint`."""
+        with self._lock:
+            record = self._records.get(endpoint)
+            if record is None:
+                record = self._records[endpoint] = _Record()
+            record.requests += 1
+            if record.mode != NORMAL and record.requests % self.resample == 0:
+                return record.mode - 1
+            return record.mode
+
+    def record(
+        self, endpoint: str, mode: int, size_in: int, size_out: int, cpu_ms: float
+    ) -> None:
+        """Record a response of `endpoint` compressed in `mode`."""
+        benefit = (size_in - size_out) / max(cpu_ms, 0.001)
+        with self._lock:
+            record = self._records[endpoint]
+            if mode < record.mode:
+                # Re-sample of the mode above the current one
+                if benefit >= self.threshold:
+                    record.mode = mode
+                    record.reset()
+                return
+            if mode != record.mode:
+                return
+
+            record.samples += 1
+            record.size_in += size_in
+            record.size_out += size_out
+            record.cpu_ms += cpu_ms
+            if record.samples < self.window:
+                return
+
+            record.ratio = record.size_out / max(record.size_in, 1)
+            record.benefit = (record.size_in - record.size_out) / max(
+                record.cpu_ms, 0.001
+            )
+            if record.benefit < self.threshold and record.mode < SKIP:
+                record.mode += 1
+            record.reset()
+
+    def decisions(self) -> dict[str, dict[str, Any]]:
+        """
+        Return the learned decisions, by endpoint: the current `mode`, and
+        the compression `ratio` and `benefit` of the last full window.
+        """
+        with self._lock:
+            return {
+                endpoint: {
+                    "mode": MODES[record.mode],
+                    "ratio": record.ratio,
+                    "benefit": record.benefit,
+                    "requests": record.requests,
+                }
+                for endpoint, record in self._records.items()
+            }
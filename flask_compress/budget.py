@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+
+class Reservation:
+    """Memory reserved for a streaming compressor, until it is released."""
+
+    __slots__ = ("budget", "size", "released")
+
+    def __init__(self, budget: StreamBudget, size: int) -> None:
+        self.budget = budget
+        self.size = size
+        self.released = False
+
+    def release(self) -> None:
+        """Return the memory to the budget, only once."""
+        self.budget._release(self)
+
+
+class StreamBudget:
+    """
+    Memory budget shared by the streaming compressors in flight.
+
+    Streamed responses reserve the estimated memory of their compressor
+    until they are closed. When the budget is tight, they fall back to
+    cheaper options or algorithms, or are not compressed at all.
+
+    :param limit: maximum memory of the compressors, in bytes
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._used = 0
+        self._streams = 0
+        self._degraded = 0
+        self._rejected = 0
+
+    def reserve(self, size: int, degraded: bool = False) -> Reservation | None:
+        """
+        Reserve `size` bytes, or return `None` if they do not fit.
+
+        :param degraded: whether the stream uses cheaper options than the
+            configured ones, which is counted in :meth:`usage`
+        """
+        with self._lock:
+            if self._used + size > self.limit:
+                return None
+            self._used += size
+            self._streams += 1
+            if degraded:
+                self._degraded += 1
+        return Reservation(self, size)
+
+    def reject(self) -> None:
+        """Count a stream left uncompressed for lack of memory."""
+        with self._lock:
+            self._rejected += 1
+
+    def _release(self, reservation: Reservation) -> None:
+        with self._lock:
+            if reservation.released:
+                return
+            reservation.released = True
+            self._used -= reservation.size
+            self._streams -= 1
+
+    def usage(self) -> dict[str, Any]:
+        """
+        Return the `limit` and the memory `used` by the streams in flight, in
+        bytes, the number of `streams` in flight, and the total number of
+        streams compressed with cheaper options (`degraded`) or left
+        uncompressed (`rejected`).
+        """
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "used": self._used,
+                "streams": self._streams,
+                "degraded": self._degraded,
+                "rejected": self._rejected,
+            }
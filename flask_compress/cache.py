@@ -0,0 +1,514 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from multiprocessing import shared_memory
+from typing import Any
+from urllib.parse import urlsplit
+
+from .tags import TAG_PREFIX
+
+
+class DiskCache:
+    """
+    Cache backend storing compressed responses as files in a directory.
+
+    The directory can be shared by all the workers of a host, and entries
+    survive restarts. Writes are atomic: a file is written under a temporary
+    name and renamed into place, so readers never see a partial entry.
+
+    When the total size of the entries exceeds `max_size`, the least recently
+    used ones are evicted until it falls under 90% of `max_size`.
+
+    :param directory: directory where the entries are stored, which should
+        only be writable by the user of the application, as its entries are
+        served as they are; it is created readable by that user only
+    :param max_size: maximum total size of the entries, in bytes
+    """
+
+    # Do not record accesses more often than this, in seconds
+    touch_interval = 60
+
+    def __init__(self, directory: str, max_size: int = 256 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def _entries(self) -> list[tuple[float, str, int]]:
+        """List `(mtime, path, size)` of the entries, removing stale temp files."""
+        entries = []
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                    if entry.name.startswith(".tmp-"):
+                        # Left behind by a writer which died mid-write
+                        if now - stat.st_mtime > 3600:
+                            os.unlink(entry.path)
+                        continue
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+        except OSError:
+            return None
+
+        # The modification time records the last access, for the LRU eviction
+        if time.time() - stat.st_mtime > self.touch_interval:
+            with contextlib.suppress(OSError):
+                os.utime(path)
+        return data
+
+    def set(self, key: str, value: bytes) -> bool:
+        if len(value) > self.max_size:
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            return False
+
+        with self._lock:
+            self._size += len(value)
+            if self._size > self.max_size:
+                self._evict()
+        return True
+
+    def _evict(self) -> None:
+        # The size is only an estimate, as other processes write entries too,
+        # so start from the actual content of the directory.
+        entries = sorted(self._entries())
+        size = sum(size for _, _, size in entries)
+        target = self.max_size * 0.9
+        for _, path, entry_size in entries:
+            if size <= target:
+                break
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            size -= entry_size
+        self._size = size
+
+
+class SharedMemoryCache:
+    """
+    Cache backend storing compressed responses in a shared memory arena.
+
+    Workers forked from the process which created the cache, e.g. gunicorn
+    workers with `--preload`, share a single copy of the compressed responses.
+    The arena is split into a fixed-size hash table indexing the entries, and
+    a data region where the entries are allocated. When either is full, the
+    least recently used entries are evicted. A process-shared lock protects
+    the arena.
+
+    :param size: size of the data region, in bytes
+    :param slots: number of slots of the hash table, at most 75% of them are
+        used by entries
+    """
+
+    _HEADER = struct.Struct("<QQQ")  # tick, live entries, used slots
+    _SLOT = struct.Struct("<B16sQQQ")  # state, digest, offset, length, tick
+    _EMPTY, _LIVE, _DELETED = 0, 1, 2
+
+    def __init__(self, size: int = 64 * 1024 * 1024, slots: int = 4096) -> None:
+        self.size = size
+        self.slots = slots
+        self._table_start = self._HEADER.size
+        self._data_start = self._table_start + slots * self._SLOT.size
+
+        self._lock = multiprocessing.Lock()
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=self._data_start + size
+        )
+        buf = self._shm.buf
+        assert buf is not None
+        self._buf: memoryview = buf
+        self._buf[: self._data_start] = bytes(self._data_start)
+
+    def close(self) -> None:
+        """Close access to the shared memory from this process."""
+        del self._buf
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Destroy the shared memory, once all processes are done with it."""
+        self._shm.unlink()
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _read_slot(self, index: int) -> tuple[int, bytes, int, int, int]:
+        return self._SLOT.unpack_from(
+            self._buf, self._table_start + index * self._SLOT.size
+        )
+
+    def _write_slot(
+        self, index: int, state: int, digest: bytes, offset: int, length: int, tick: int
+    ) -> None:
+        self._SLOT.pack_into(
+            self._buf,
+            self._table_start + index * self._SLOT.size,
+            state,
+            digest,
+            offset,
+            length,
+            tick,
+        )
+
+    def _next_tick(self) -> int:
+        tick, live, used = self._HEADER.unpack_from(self._buf, 0)
+        self._HEADER.pack_into(self._buf, 0, tick + 1, live, used)
+        return int(tick) + 1
+
+    def _find(self, digest: bytes) -> int:
+        index = int.from_bytes(digest[:8], "little") % self.slots
+        for _ in range(self.slots):
+            state, slot_digest, _, _, _ = self._read_slot(index)
+            if state == self._EMPTY:
+                break
+            if state == self._LIVE and slot_digest == digest:
+                return index
+            index = (index + 1) % self.slots
+        return -1
+
+    def _live_entries(self) -> list[tuple[int, int, int, int]]:
+        """List `(tick, offset, length, index)` of the live entries."""
+        table = self._buf[self._table_start : self._data_start]
+        return [
+            (tick, offset, length, index)
+            for index, (state, _, offset, length, tick) in enumerate(
+                self._SLOT.iter_unpack(table)
+            )
+            if state == self._LIVE
+        ]
+
+    def _delete(self, index: int) -> None:
+        _, digest, _, _, _ = self._read_slot(index)
+        self._write_slot(index, self._DELETED, digest, 0, 0, 0)
+        tick, live, used = self._HEADER.unpack_from(self._buf, 0)
+        self._HEADER.pack_into(self._buf, 0, tick, live - 1, used)
+
+    def _allocate(self, length: int) -> int:
+        """Find room for `length` bytes, evicting LRU entries as needed."""
+        entries = self._live_entries()
+        lru = sorted(entries)
+        while True:
+            if len(entries) < self.slots * 0.75:
+                end = 0
+                for _, offset, entry_length, _ in sorted(entries, key=lambda e: e[1]):
+                    if offset - end >= length:
+                        return end
+                    end = offset + entry_length
+                if self.size - end >= length:
+                    return end
+
+            entry = lru.pop(0)
+            entries.remove(entry)
+            self._delete(entry[3])
+
+    def _rebuild(self) -> None:
+        """Rebuild the hash table, getting rid of deleted slots."""
+        entries = []
+        for index in range(self.slots):
+            state, digest, offset, length, tick = self._read_slot(index)
+            if state == self._LIVE:
+                entries.append((digest, offset, length, tick))
+        self._buf[self._table_start : self._data_start] = bytes(
+            self._data_start - self._table_start
+        )
+        tick, _, _ = self._HEADER.unpack_from(self._buf, 0)
+        self._HEADER.pack_into(self._buf, 0, tick, 0, 0)
+        for digest, offset, length, entry_tick in entries:
+            self._insert(digest, offset, length, entry_tick)
+
+    def _insert(self, digest: bytes, offset: int, length: int, tick: int) -> None:
+        index = int.from_bytes(digest[:8], "little") % self.slots
+        while True:
+            state, _, _, _, _ = self._read_slot(index)
+            if state != self._LIVE:
+                break
+            index = (index + 1) % self.slots
+        self._write_slot(index, self._LIVE, digest, offset, length, tick)
+        header_tick, live, used = self._HEADER.unpack_from(self._buf, 0)
+        used += state == self._EMPTY
+        self._HEADER.pack_into(self._buf, 0, header_tick, live + 1, used)
+
+    def get(self, key: str) -> bytes | None:
+        digest = self._digest(key)
+        with self._lock:
+            index = self._find(digest)
+            if index < 0:
+                return None
+            state, digest, offset, length, _ = self._read_slot(index)
+            self._write_slot(index, state, digest, offset, length, self._next_tick())
+            start = self._data_start + offset
+            return bytes(self._buf[start : start + length])
+
+    def set(self, key: str, value: bytes) -> bool:
+        if len(value) > self.size:
+            return False
+
+        digest = self._digest(key)
+        with self._lock:
+            index = self._find(digest)
+            if index >= 0:
+                self._delete(index)
+
+            offset = self._allocate(len(value))
+            start = self._data_start + offset
+            self._buf[start : start + len(value)] = value
+
+            _, _, used = self._HEADER.unpack_from(self._buf, 0)
+            if used >= self.slots * 0.9:
+                self._rebuild()
+            self._insert(digest, offset, len(value), self._next_tick())
+        return True
+
+
+class _RedisError(Exception):
+    """Error reply of the Redis server."""
+
+
+class _RedisConnection:
+    def __init__(self, host: str, port: int, timeout: float) -> None:
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+    def execute(self, *commands: tuple[bytes | str | int, ...]) -> list[Any]:
+        """Send all `commands` at once (pipelining), and read their replies."""
+        chunks = []
+        for command in commands:
+            chunks.append(b"*%d\r\n" % len(command))
+            for arg in command:
+                if isinstance(arg, str):
+                    arg = arg.encode()
+                elif isinstance(arg, int):
+                    arg = b"%d" % arg
+                chunks.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self.sock.sendall(b"".join(chunks))
+        return [self._read_reply() for _ in commands]
+
+    def _read_reply(self) -> Any:
+        line = self.file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the Redis server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise _RedisError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.file.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by the Redis server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from the Redis server: {line!r}")
+
+
+class RedisCache:
+    """
+    Cache backend storing compressed responses in a Redis server.
+
+    It speaks the Redis protocol directly, with a pool of connections shared
+    by the threads of a worker. :meth:`get_many` and :meth:`set_many` send
+    all their commands in a single round-trip.
+
+    The cache never fails a request: errors and timeouts count as a miss for
+    lookups and are ignored for stores, and the server is not contacted again
+    for `retry_interval` seconds, so responses are compressed without cache
+    in the meantime.
+
+    An optional in-process tier keeps the `local_size` most recently used
+    entries for `local_ttl` seconds, saving round-trips for the hottest
+    pages. It is only eventually consistent: the entries replaced by other
+    workers are seen once the local copies expire. The tokens of
+    `COMPRESS_CACHE_TAGS` are never kept in it, so that invalidations are
+    seen at once by every worker.
+
+    :param url: `redis://[:password@]host[:port][/db]` URL of the server
+    :param timeout: timeout of the network operations, in seconds
+    :param max_connections: maximum number of connections of the pool
+    :param ttl: expiry of the entries in seconds, `None` means no expiry
+    :param local_size: number of entries of the in-process tier, `0` disables it
+    :param local_ttl: expiry of the entries of the in-process tier in seconds,
+        bounded by `ttl`
+    :param retry_interval: delay before contacting the server after an error,
+        in seconds
+    :param prefix: prefix of the keys in the Redis server
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        timeout: float = 0.1,
+        max_connections: int = 8,
+        ttl: int | None = None,
+        local_size: int = 0,
+        local_ttl: float = 5.0,
+        retry_interval: float = 5.0,
+        prefix: str = "flask-compress:",
+    ) -> None:
+        parsed = urlsplit(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.ttl = ttl
+        self.local_size = local_size
+        self.local_ttl = local_ttl if ttl is None else min(local_ttl, ttl)
+        self.retry_interval = retry_interval
+        self.prefix = prefix
+
+        self._pool: queue.LifoQueue[_RedisConnection | None] = queue.LifoQueue()
+        for _ in range(max_connections):
+            self._pool.put(None)  # Connections are opened lazily
+        self._down_until = 0.0
+        # Expiry time and value of the entries of the in-process tier
+        self._local: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._local_lock = threading.Lock()
+
+    def _connect(self) -> _RedisConnection:
+        connection = _RedisConnection(self.host, self.port, self.timeout)
+        commands: list[tuple[bytes | str | int, ...]] = []
+        if self.password:
+            commands.append(("AUTH", self.password))
+        if self.db:
+            commands.append(("SELECT", self.db))
+        if commands:
+            try:
+                connection.execute(*commands)
+            except Exception:
+                connection.close()
+                raise
+        return connection
+
+    def _execute(self, *commands: tuple[bytes | str | int, ...]) -> list[Any] | None:
+        """Run the commands on a pooled connection, `None` on failure."""
+        if time.monotonic() < self._down_until:
+            return None
+
+        try:
+            connection = self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+
+        try:
+            if connection is None:
+                connection = self._connect()
+            replies = connection.execute(*commands)
+        except (OSError, ValueError, _RedisError):
+            if connection is not None:
+                connection.close()
+            self._pool.put(None)
+            self._down_until = time.monotonic() + self.retry_interval
+            return None
+
+        self._pool.put(connection)
+        return replies
+
+    def _is_local(self, key: str) -> bool:
+        return self.local_size > 0 and not key.startswith(TAG_PREFIX)
+
+    def _get_local(self, key: str) -> bytes | None:
+        with self._local_lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if time.monotonic() >= expires:
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _set_local(self, key: str, value: bytes) -> None:
+        with self._local_lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _set_command(self, key: str, value: bytes) -> tuple[bytes | str | int, ...]:
+        if self.ttl is None:
+            return ("SET", self.prefix + key, value)
+        return ("SET", self.prefix + key, value, "EX", self.ttl)
+
+    def get(self, key: str) -> bytes | None:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Iterable[str]) -> list[bytes | None]:
+        keys = list(keys)
+        values = [self._get_local(key) if self._is_local(key) else None for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if not missing:
+            return values
+
+        replies = self._execute(("MGET", *(self.prefix + key for key in missing)))
+        if replies is None:
+            return values
+
+        found = dict(zip(missing, replies[0]))
+        for i, key in enumerate(keys):
+            if values[i] is None and found[key] is not None:
+                values[i] = found[key]
+                if self._is_local(key):
+                    self._set_local(key, found[key])
+        return values
+
+    def set(self, key: str, value: bytes) -> bool:
+        return self.set_many({key: value})
+
+    def set_many(self, mapping: Mapping[str, bytes]) -> bool:
+        for key, value in mapping.items():
+            if self._is_local(key):
+                self._set_local(key, value)
+        commands = [self._set_command(key, value) for key, value in mapping.items()]
+        if not commands:
+            return True
+        return self._execute(*commands) is not None
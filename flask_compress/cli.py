@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+cli = AppGroup("compress", help="Flask-Compress commands.")
+
+
+@cli.command("warm")
+@click.argument("targets", nargs=-1, required=True)
+@click.option("--base-url", default=None, help="Base URL of the simulated requests.")
+@click.option(
+    "--workers", type=int, default=None, help="Number of compression threads."
+)
+def warm_command(
+    targets: tuple[str, ...], base_url: str | None, workers: int | None
+) -> None:
+    """Fill the cache with the compressed responses of URLs or endpoints.
+
+    TARGETS are URL paths (starting with /) or endpoint names. This is only
+    useful with a cache backend shared with the application workers.
+    """
+    compress = current_app.extensions["compress"].compress
+    count = compress.warm_cache(targets, base_url=base_url, max_workers=workers)
+    click.echo(f"Stored {count} compressed responses in the cache.")
@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import functools
+from collections.abc import Iterable, Mapping, Sequence
+from types import ModuleType
+from typing import Any, Protocol
+
+from .compat import compression
+
+
+class StreamCompressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+    def flush(self) -> bytes: ...
+
+
+class StreamDecompressor(Protocol):
+    """
+    Incremental decompressor, with the interface of
+    :class:`compression.zstd.ZstdDecompressor`: :meth:`decompress` returns at
+    most `max_length` bytes, and must be called again with empty data while
+    `needs_input` is false. `eof` is true once the end of the stream is reached.
+    """
+
+    @property
+    def needs_input(self) -> bool: ...
+    @property
+    def eof(self) -> bool: ...
+    def decompress(self, data: bytes, max_length: int) -> bytes: ...
+
+
+class Codec:
+    """
+    Base class of the codecs, compressing data for one content coding.
+
+    Subclasses set :attr:`name`, the value of the `Content-Encoding` header,
+    and implement :meth:`compressor` and :meth:`decompress`. :meth:`compress`
+    can be overridden with a faster one-shot implementation. The modules of a
+    codec should only be imported on first use, or by :meth:`load`.
+    """
+
+    name: str
+    # Config option holding the compression level, if any
+    level_key: str | None = None
+    # Extension of the files precompressed with the codec, if any
+    extension: str | None = None
+
+    def load(self) -> None:
+        """
+        Import the modules of the codec ahead of its first use, raising an
+        :class:`ImportError` naming the missing package, if any.
+        """
+
+    def compress(self, data: bytes, config: Mapping[str, Any]) -> bytes:
+        """Compress `data` with the levels of `config`, in one shot."""
+        compressor = self.compressor(config)
+        return compressor.compress(data) + compressor.flush()
+
+    def compressor(self, config: Mapping[str, Any]) -> StreamCompressor:
+        """Return an incremental compressor using the levels of `config`."""
+        raise NotImplementedError
+
+    def compress_sequence(
+        self, chunks: Sequence[bytes], config: Mapping[str, Any]
+    ) -> list[bytes]:
+        """
+        Compress the chunks of a buffered response, without joining them, and
+        return the compressed chunks. A single chunk is compressed in one shot.
+        """
+        if len(chunks) == 1:
+            return [self.compress(chunks[0], config)]
+        try:
+            compressor = self.compressor(config)
+        except NotImplementedError:
+            return [self.compress(b"".join(chunks), config)]
+        output = []
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                output.append(out)
+        output.append(compressor.flush())
+        return output
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompressor(self) -> StreamDecompressor:
+        """Return an incremental decompressor."""
+        raise NotImplementedError
+
+    def memory(self, config: Mapping[str, Any]) -> int:
+        """
+        Return a rough estimate of the memory held by an incremental
+        compressor using `config`, once it has processed a long stream.
+        """
+        return 0
+
+    def reductions(self, config: Mapping[str, Any]) -> list[dict[str, Any]]:
+        """
+        Return option overrides reducing the memory of an incremental
+        compressor using `config`, from the mildest to the most aggressive.
+        """
+        return []
+
+
+@functools.lru_cache(maxsize=None)
+def _zlib_module() -> ModuleType:
+    """
+    Return the fastest installed zlib implementation: zlib-ng, which is a
+    drop-in replacement, then ISA-L, then the standard library.
+    """
+    try:
+        from zlib_ng import zlib_ng
+
+        return zlib_ng
+    except ImportError:
+        pass
+    try:
+        from isal import isal_zlib
+
+        return isal_zlib
+    except ImportError:
+        return compression.zlib
+
+
+class ZlibCodec(Codec):
+    """
+    gzip and deflate codecs, relying on a zlib compatible module.
+
+    :param name: name of the content coding
+    :param level_key: config option holding the compression level
+    :param wbits: window bits selecting the container, 31 for gzip and 15 for
+        the zlib format of deflate
+    :param zlib: zlib compatible module, defaults to the fastest installed one
+    :param extension: extension of the precompressed files, if any
+    """
+
+    level_key: str
+
+    def __init__(
+        self,
+        name: str,
+        level_key: str,
+        wbits: int,
+        zlib: ModuleType | None = None,
+        extension: str | None = None,
+    ) -> None:
+        self.name = name
+        self.level_key = level_key
+        self.wbits = wbits
+        self._zlib = zlib
+        self.extension = extension
+
+    @property
+    def zlib(self) -> ModuleType:
+        if self._zlib is None:
+            self._zlib = _zlib_module()
+        return self._zlib
+
+    def load(self) -> None:
+        self.zlib
+
+    def _level(self, level: int) -> int:
+        if not hasattr(self.zlib, "ISAL_DEFAULT_COMPRESSION"):
+            return level
+        # ISA-L only has levels 0 to 3, spread them over the zlib levels
+        if level < 0:
+            return self.zlib.ISAL_DEFAULT_COMPRESSION  # type: ignore[no-any-return]
+        return min(level // 3, int(self.zlib.ISAL_BEST_COMPRESSION))
+
+    def compressor(self, config: Mapping[str, Any]) -> StreamCompressor:
+        level = self._level(config[self.level_key])
+        return self.zlib.compressobj(  # type: ignore[no-any-return]
+            level, self.zlib.DEFLATED, self.wbits
+        )
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.zlib.decompress(data, self.wbits)  # type: ignore[no-any-return]
+
+    def decompressor(self) -> StreamDecompressor:
+        return _ZlibDecompressor(self.zlib.decompressobj(self.wbits))
+
+    def memory(self, config: Mapping[str, Any]) -> int:
+        # From zlib.h, with the default memLevel of 8
+        return (1 << ((self.wbits & 15) + 2)) + (1 << (8 + 9))
+
+
+class _ZlibDecompressor:
+    def __init__(self, decompressor: Any) -> None:
+        self._decompressor = decompressor
+        self.needs_input = True
+
+    @property
+    def eof(self) -> bool:
+        return bool(self._decompressor.eof)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        data = self._decompressor.unconsumed_tail + data
+        out: bytes = self._decompressor.decompress(data, max_length)
+        self.needs_input = not self._decompressor.unconsumed_tail
+        return out
+
+
+class _BrotliCompressor:
+    def __init__(self, compressor: Any) -> None:
+        self._compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)  # type: ignore[no-any-return]
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()  # type: ignore[no-any-return]
+
+
+@functools.lru_cache(maxsize=None)
+def _brotli() -> ModuleType:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        import brotli
+    module: ModuleType = brotli
+    return module
+
+
+class _BrotliDecompressor:
+    def __init__(self, decompressor: Any) -> None:
+        self._decompressor = decompressor
+
+    @property
+    def needs_input(self) -> bool:
+        # brotlicffi and brotli < 1.2 cannot limit the output
+        can_accept_more_data = getattr(self._decompressor, "can_accept_more_data", None)
+        return can_accept_more_data is None or bool(can_accept_more_data())
+
+    @property
+    def eof(self) -> bool:
+        return bool(self._decompressor.is_finished())
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        if hasattr(self._decompressor, "can_accept_more_data"):
+            out = self._decompressor.process(data, output_buffer_limit=max_length)
+        else:
+            out = self._decompressor.process(data)
+        return out  # type: ignore[no-any-return]
+
+
+class BrotliCodec(Codec):
+    name = "br"
+    level_key = "COMPRESS_BR_LEVEL"
+    extension = ".br"
+
+    def load(self) -> None:
+        try:
+            _brotli()
+        except ImportError as error:
+            raise ImportError(
+                "The 'br' compression algorithm requires the 'brotli' package, "
+                "or 'brotlicffi' on PyPy."
+            ) from error
+
+    @staticmethod
+    def _options(config: Mapping[str, Any]) -> dict[str, int]:
+        return {
+            "mode": config["COMPRESS_BR_MODE"],
+            "quality": config["COMPRESS_BR_LEVEL"],
+            "lgwin": config["COMPRESS_BR_WINDOW"],
+            "lgblock": config["COMPRESS_BR_BLOCK"],
+        }
+
+    def compress(self, data: bytes, config: Mapping[str, Any]) -> bytes:
+        options = self._options(config)
+        return _brotli().compress(data, **options)  # type: ignore[no-any-return]
+
+    def compressor(self, config: Mapping[str, Any]) -> StreamCompressor:
+        return _BrotliCompressor(_brotli().Compressor(**self._options(config)))
+
+    def decompress(self, data: bytes) -> bytes:
+        return _brotli().decompress(data)  # type: ignore[no-any-return]
+
+    def decompressor(self) -> StreamDecompressor:
+        return _BrotliDecompressor(_brotli().Decompressor())
+
+    def memory(self, config: Mapping[str, Any]) -> int:
+        quality = config["COMPRESS_BR_LEVEL"]
+        window: int = 1 << config["COMPRESS_BR_WINDOW"]
+        # Ring buffer, and hash tables growing with the quality
+        if quality < 2:
+            return window + (1 << 17)
+        if quality < 5:
+            return window + (1 << 20)
+        if quality < 10:
+            return window + (1 << 22)
+        return window * 9
+
+    def reductions(self, config: Mapping[str, Any]) -> list[dict[str, Any]]:
+        quality = config["COMPRESS_BR_LEVEL"]
+        lgwin = config["COMPRESS_BR_WINDOW"]
+        candidates = [
+            {"COMPRESS_BR_WINDOW": min(lgwin, 18), "COMPRESS_BR_LEVEL": quality},
+            {
+                "COMPRESS_BR_WINDOW": min(lgwin, 16),
+                "COMPRESS_BR_LEVEL": min(quality, 4),
+            },
+            {
+                "COMPRESS_BR_WINDOW": min(lgwin, 16),
+                "COMPRESS_BR_LEVEL": min(quality, 1),
+            },
+        ]
+        return _distinct(config, candidates)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    level_key = "COMPRESS_ZSTD_LEVEL"
+    extension = ".zst"
+
+    def load(self) -> None:
+        try:
+            compression.zstd
+        except ImportError as error:
+            raise ImportError(
+                "The 'zstd' compression algorithm requires the 'backports.zstd' "
+                "package before Python 3.14."
+            ) from error
+
+    def compress(self, data: bytes, config: Mapping[str, Any]) -> bytes:
+        return compression.zstd.compress(  # type: ignore[no-any-return]
+            data, config["COMPRESS_ZSTD_LEVEL"]
+        )
+
+    def compressor(self, config: Mapping[str, Any]) -> StreamCompressor:
+        return compression.zstd.ZstdCompressor(  # type: ignore[no-any-return]
+            level=config["COMPRESS_ZSTD_LEVEL"]
+        )
+
+    def decompress(self, data: bytes) -> bytes:
+        return compression.zstd.decompress(data)  # type: ignore[no-any-return]
+
+    def decompressor(self) -> StreamDecompressor:
+        return compression.zstd.ZstdDecompressor()  # type: ignore[no-any-return]
+
+    def memory(self, config: Mapping[str, Any]) -> int:
+        level = config["COMPRESS_ZSTD_LEVEL"] or 3
+        # Window and tables of the default parameters for large inputs
+        for max_level, size in _ZSTD_MEMORY:
+            if level <= max_level:
+                return size
+        return _ZSTD_MEMORY[-1][1]
+
+    def reductions(self, config: Mapping[str, Any]) -> list[dict[str, Any]]:
+        level = config["COMPRESS_ZSTD_LEVEL"] or 3
+        candidates = [
+            {"COMPRESS_ZSTD_LEVEL": min(level, 3)},
+            {"COMPRESS_ZSTD_LEVEL": min(level, 1)},
+        ]
+        return _distinct(config, candidates)
+
+
+# Memory of a zstd compressor, by maximum level
+_ZSTD_MEMORY = [
+    (1, 1 << 20),
+    (3, 3 << 20),
+    (6, 6 << 20),
+    (9, 12 << 20),
+    (12, 42 << 20),
+    (15, 64 << 20),
+    (22, 96 << 20),
+]
+
+
+def _distinct(
+    config: Mapping[str, Any], candidates: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """Drop the candidate overrides which do not change the previous ones."""
+    reductions = []
+    previous = {key: config[key] for key in candidates[0]}
+    for candidate in candidates:
+        if candidate != previous:
+            reductions.append(candidate)
+            previous = candidate
+    return reductions
+
+
+_CODECS: dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    """
+    Register a codec under its name, replacing the codec of the same name
+    if any. The name can then be used in `COMPRESS_ALGORITHM`.
+    """
+    _CODECS[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return _CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown compression algorithm: {name}") from None
+
+
+def level_keys() -> set[str]:
+    """Return the config options holding the levels of the registered codecs."""
+    return {codec.level_key for codec in _CODECS.values() if codec.level_key}
+
+
+def load_codecs(names: Iterable[str]) -> None:
+    """
+    Import the codecs of the algorithms `names`, so that a misconfigured
+    algorithm fails at initialisation rather than on the first request.
+    """
+    for name in names:
+        get_codec(name).load()
+
+
+register_codec(ZstdCodec())
+register_codec(BrotliCodec())
+register_codec(ZlibCodec("gzip", "COMPRESS_LEVEL", 31, extension=".gz"))
+register_codec(ZlibCodec("deflate", "COMPRESS_DEFLATE_LEVEL", 15))
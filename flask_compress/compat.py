@@ -4,23 +4,47 @@
 # Use the Python 3.14 `compression` module if possible.
 # If unavailable, mimic the module structure for backwards compatibility.
 #
+# The modules are imported on first access, so that the codecs which are not
+# enabled cost neither import time nor memory.
+#
 # When Python 3.14 is the lowest supported version,
 # the `import compression.*` statements can move to `flask_compress.py`
-# and this try/except block can be removed from this file.
+# and this file can be removed.
+from __future__ import annotations
+
+import functools
+import importlib
 import sys
+from types import ModuleType
 
 if sys.version_info >= (3, 14):
-    import compression.gzip
-    import compression.zlib
-    import compression.zstd
+    _MODULES = {
+        "gzip": "compression.gzip",
+        "zlib": "compression.zlib",
+        "zstd": "compression.zstd",
+    }
 else:  # Python <= 3.13
-    import gzip
-    import types
-    import zlib
+    _MODULES = {
+        "gzip": "gzip",
+        "zlib": "zlib",
+        "zstd": "backports.zstd",
+    }
+
+
+class _Compression:
+    """Namespace of the `compression` modules, imported lazily."""
+
+    @functools.cached_property
+    def gzip(self) -> ModuleType:
+        return importlib.import_module(_MODULES["gzip"])
+
+    @functools.cached_property
+    def zlib(self) -> ModuleType:
+        return importlib.import_module(_MODULES["zlib"])
+
+    @functools.cached_property
+    def zstd(self) -> ModuleType:
+        return importlib.import_module(_MODULES["zstd"])
 
-    from backports import zstd
 
-    compression = types.SimpleNamespace()
-    compression.gzip = gzip
-    compression.zlib = zlib
-    compression.zstd = zstd
+compression = _Compression()
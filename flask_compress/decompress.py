@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import io
+from typing import IO
+
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge
+
+from .codecs import StreamDecompressor
+
+
+class DecompressingStream(io.RawIOBase):
+    """
+    Read-only stream decompressing another stream as it is read.
+
+    :param stream: the compressed stream
+    :param decompressor: incremental decompressor of the content coding
+    :param max_size: maximum size of the decompressed data, in bytes, beyond
+        which :class:`~werkzeug.exceptions.RequestEntityTooLarge` is raised
+    :param chunk_size: size of the reads from `stream`
+    """
+
+    def __init__(
+        self,
+        stream: IO[bytes],
+        decompressor: StreamDecompressor,
+        max_size: int | None,
+        chunk_size: int = 16384,
+    ) -> None:
+        self._stream = stream
+        self._decompressor = decompressor
+        self._max_size = max_size
+        self._chunk_size = chunk_size
+        self._size = 0
+        self._pending = b""
+        self._input_eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:  # type: ignore[override]
+        if not self._pending:
+            self._pending = self._decompress(len(buffer))
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def _decompress(self, max_length: int) -> bytes:
+        while not self._decompressor.eof:
+            data = b""
+            if self._decompressor.needs_input and not self._input_eof:
+                data = self._stream.read(self._chunk_size)
+                self._input_eof = not data
+            try:
+                out = self._decompressor.decompress(data, max_length)
+            except HTTPException:
+                raise
+            except Exception as error:
+                raise BadRequest("Invalid compressed request body.") from error
+
+            if out:
+                self._size += len(out)
+                if self._max_size is not None and self._size > self._max_size:
+                    raise RequestEntityTooLarge(
+                        "The decompressed request body is too large."
+                    )
+                return out
+
+            if (
+                self._input_eof
+                and self._decompressor.needs_input
+                and not self._decompressor.eof
+            ):
+                raise BadRequest("Truncated compressed request body.")
+        return b""
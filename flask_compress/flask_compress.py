@@ -4,21 +4,66 @@
 
 from __future__ import annotations
 
+import copy
+import fnmatch
 import functools
+import hmac
+import inspect
+import io
+import json
+import os
+import threading
+import time
+import urllib.parse
+import weakref
 from collections import defaultdict
-from collections.abc import Callable, Iterator
+from collections.abc import (
+    Callable,
+    Coroutine,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
 from functools import lru_cache
-from typing import Any, Protocol
-
-try:
-    import brotlicffi as brotli
-except ImportError:
-    import brotli
-
-from flask import Flask, after_this_request, current_app, request, stream_with_context
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, NamedTuple, Protocol, TypeVar
+
+from flask import (
+    Flask,
+    after_this_request,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 from flask.wrappers import Response
-
-from .compat import compression
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import UnsupportedMediaType
+from werkzeug.http import is_resource_modified, parse_etags
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from .adaptive import FAST, FAST_LEVELS, NORMAL, SKIP, AdaptiveTuner
+from .budget import Reservation, StreamBudget
+from .cli import cli
+from .codecs import get_codec, level_keys, load_codecs
+from .decompress import DecompressingStream
+from .hints import ACCEPT_CH, HINT_HEADERS, NETWORKS, network_class, prefer
+from .profiling import PROFILE_HEADER, Profile, Profiler
+from .steps import Steps, async_run, run
+from .tags import ALL, AsyncTaggedCache, TaggedCache, endpoint_tag, new_token, tag_key
+from .tracing import NULL_SPAN, Span, Tracer
+
+# asyncio and concurrent.futures, slow to import, are imported by the code
+# paths using them
+if TYPE_CHECKING:
+    import asyncio
+    from concurrent.futures import Future, ThreadPoolExecutor
 
 
 class CacheBackend(Protocol):
@@ -26,6 +71,116 @@ class CacheBackend(Protocol):
     def set(self, key: str, value: bytes) -> bool | None: ...
 
 
+class AsyncCacheBackend(Protocol):
+    async def get(self, key: str) -> bytes | None: ...
+    async def set(self, key: str, value: bytes) -> bool | None: ...
+
+
+class _AsyncCacheAdapter:
+    """Adapt a :class:`CacheBackend` to :class:`AsyncCacheBackend`."""
+
+    def __init__(self, cache: CacheBackend) -> None:
+        self.cache = cache
+
+    async def get(self, key: str) -> bytes | None:
+        import asyncio
+
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def set(self, key: str, value: bytes) -> bool | None:
+        import asyncio
+
+        return await asyncio.to_thread(self.cache.set, key, value)
+
+
+class _LoopCacheAdapter:
+    """
+    Run the coroutines of an :class:`AsyncCacheBackend` in the event loop of
+    the background thread, awaited from the loop of an async view, which
+    Flask creates for each request.
+    """
+
+    def __init__(self, cache: AsyncCacheBackend) -> None:
+        self.cache = cache
+
+    async def get(self, key: str) -> bytes | None:
+        return await _await_in_loop(self.cache.get(key))
+
+    async def set(self, key: str, value: bytes) -> bool | None:
+        return await _await_in_loop(self.cache.set(key, value))
+
+
+class _SyncCacheAdapter:
+    """
+    Adapt an :class:`AsyncCacheBackend` to :class:`CacheBackend`.
+
+    The coroutines of the backend run in a single event loop of a background
+    thread, which lives as long as the process, as asynchronous clients such
+    as :mod:`redis.asyncio` are bound to the loop in which they connected.
+    """
+
+    def __init__(self, cache: AsyncCacheBackend) -> None:
+        self.cache = cache
+
+    def get(self, key: str) -> bytes | None:
+        return _run_in_loop(self.cache.get(key))
+
+    def set(self, key: str, value: bytes) -> bool | None:
+        return _run_in_loop(self.cache.set(key, value))
+
+
+T = TypeVar("T")
+
+# Event loop of the asynchronous backends
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop of the background thread, started on first use."""
+    import asyncio
+
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="flask-compress-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def _run_in_loop(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run `coroutine` in the event loop of the background thread."""
+    import asyncio
+
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+
+async def _await_in_loop(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Await `coroutine`, run in the event loop of the background thread."""
+    import asyncio
+
+    future = asyncio.run_coroutine_threadsafe(coroutine, _background_loop())
+    return await asyncio.wrap_future(future)
+
+
+def _is_async_cache(cache: CacheBackend | AsyncCacheBackend) -> bool:
+    return inspect.iscoroutinefunction(cache.get)
+
+
+def _as_async_cache(cache: CacheBackend | AsyncCacheBackend) -> AsyncCacheBackend:
+    if _is_async_cache(cache):
+        return _LoopCacheAdapter(cache)  # type: ignore[arg-type]
+    return _AsyncCacheAdapter(cache)  # type: ignore[arg-type]
+
+
+def _as_sync_cache(cache: CacheBackend | AsyncCacheBackend) -> CacheBackend:
+    if _is_async_cache(cache):
+        return _SyncCacheAdapter(cache)  # type: ignore[arg-type]
+    return cache  # type: ignore[return-value]
+
+
 class DictCache:
 
     def __init__(self) -> None:
@@ -101,7 +256,7 @@ def _choose_algorithm(algorithms: tuple[str, ...], accept_encoding: str) -> str
                 if server_algo in viable_algos:
                     return server_algo
 
-    if fallback_to_any:
+    if fallback_to_any and algorithms:
         return algorithms[0]
     return None
 
@@ -120,6 +275,298 @@ def _format(algo: str | list[str]) -> tuple[str, ...]:
         return tuple(algo)
 
 
+def _add_to_header(headers: Headers, name: str, value: str) -> None:
+    """Add `value` to the comma-separated header `name`, unless already present."""
+    current = headers.get(name)
+    if not current:
+        headers[name] = value
+    elif value.lower() not in {v.strip().lower() for v in current.split(",")}:
+        headers[name] = f"{current}, {value}"
+
+
+def _vary_accept_encoding(headers: Headers) -> None:
+    """Add `Accept-Encoding` to the `Vary` header, unless already present."""
+    _add_to_header(headers, "Vary", "Accept-Encoding")
+
+
+# Headers stored along with the body with `COMPRESS_CACHE_RESPONSE`
+_CACHED_RESPONSE_HEADERS = {
+    "cache-control",
+    "content-encoding",
+    "content-language",
+    "content-type",
+    "etag",
+    "expires",
+    "last-modified",
+    "vary",
+}
+
+# Headers a cached response may vary on, which are part of its cache key
+_CACHEABLE_VARY = frozenset(
+    {"accept-encoding", *(name.lower() for name in HINT_HEADERS)}
+)
+
+# Background jobs waiting for the thread, each holding a response body,
+# beyond which new jobs are dropped
+_MAX_BACKGROUND_JOBS = 64
+
+# Headers of `COMPRESS_SENDFILE`, handing the transfer of a file to the server
+_SENDFILE_HEADERS = {"x-sendfile": "X-Sendfile", "x-accel-redirect": "X-Accel-Redirect"}
+
+
+_DEFAULTS: tuple[tuple[str, Any], ...] = (
+    (
+        "COMPRESS_MIMETYPES",
+        [
+            "text/html",
+            "text/css",
+            "text/plain",
+            "text/xml",
+            "text/x-component",
+            "text/javascript",  # Obsolete (RFC 9239)
+            "application/x-javascript",
+            "application/javascript",
+            "application/json",
+            "application/manifest+json",
+            "application/vnd.api+json",
+            "application/xml",
+            "application/xhtml+xml",
+            "application/rss+xml",
+            "application/atom+xml",
+            "application/vnd.ms-fontobject",
+            "application/x-font-ttf",
+            "application/x-font-opentype",
+            "application/x-font-truetype",
+            "image/svg+xml",
+            "image/x-icon",
+            "image/vnd.microsoft.icon",
+            "font/ttf",
+            "font/eot",
+            "font/otf",
+            "font/opentype",
+        ],
+    ),
+    ("COMPRESS_MIMETYPE_OPTIONS", {}),
+    ("COMPRESS_LEVEL", 6),
+    ("COMPRESS_BR_LEVEL", 4),
+    ("COMPRESS_BR_MODE", 0),
+    ("COMPRESS_BR_WINDOW", 22),
+    ("COMPRESS_BR_BLOCK", 0),
+    ("COMPRESS_ZSTD_LEVEL", 3),
+    ("COMPRESS_DEFLATE_LEVEL", -1),
+    ("COMPRESS_MIN_SIZE", 500),
+    ("COMPRESS_CACHE_KEY", None),
+    ("COMPRESS_CACHE_BACKEND", None),
+    ("COMPRESS_CACHE_FILL_ALL", False),
+    ("COMPRESS_CACHE_RESPONSE", False),
+    ("COMPRESS_CACHE_TAGS", False),
+    ("COMPRESS_CACHE_RECOMPRESS", False),
+    (
+        "COMPRESS_CACHE_RECOMPRESS_LEVELS",
+        {
+            "COMPRESS_LEVEL": 9,
+            "COMPRESS_DEFLATE_LEVEL": 9,
+            "COMPRESS_ZSTD_LEVEL": 19,
+            "COMPRESS_BR_LEVEL": 11,
+        },
+    ),
+    ("COMPRESS_REGISTER", True),
+    ("COMPRESS_ADAPTIVE", False),
+    ("COMPRESS_ADAPTIVE_THRESHOLD", 1024),
+    ("COMPRESS_ADAPTIVE_WINDOW", 20),
+    ("COMPRESS_ADAPTIVE_RESAMPLE", 100),
+    ("COMPRESS_PROFILE", False),
+    ("COMPRESS_PROFILE_TOKEN", None),
+    ("COMPRESS_PROFILE_INTERVAL", 100),
+    ("COMPRESS_PROFILE_TRACEMALLOC", 0.0),
+    ("COMPRESS_PROFILE_CALLBACK", None),
+    ("COMPRESS_TRACING", True),
+    ("COMPRESS_TRACER_PROVIDER", None),
+    ("COMPRESS_STREAMS", True),
+    ("COMPRESS_STREAM_MEMORY_BUDGET", None),
+    ("COMPRESS_REQUEST_ALGORITHM", []),
+    ("COMPRESS_REQUEST_MAX_SIZE", 16 * 1024 * 1024),
+    ("COMPRESS_CLIENT_HINTS", False),
+    ("COMPRESS_SLOW_NETWORK_ALGORITHM", ["br", "zstd", "gzip", "deflate"]),
+    (
+        "COMPRESS_SLOW_NETWORK_LEVELS",
+        {
+            "COMPRESS_LEVEL": 9,
+            "COMPRESS_DEFLATE_LEVEL": 9,
+            "COMPRESS_ZSTD_LEVEL": 19,
+            "COMPRESS_BR_LEVEL": 11,
+        },
+    ),
+    ("COMPRESS_FAST_NETWORK_ALGORITHM", ["zstd", "br", "gzip", "deflate"]),
+    ("COMPRESS_FAST_NETWORK_LEVELS", FAST_LEVELS),
+    ("COMPRESS_EVALUATE_CONDITIONAL_REQUEST", True),
+    ("COMPRESS_STREAMING_ENDPOINT_CONDITIONAL", ["static"]),
+    ("COMPRESS_PRECOMPRESSED", False),
+    ("COMPRESS_SENDFILE", None),
+    ("COMPRESS_SENDFILE_LOCATIONS", {}),
+    ("COMPRESS_ALGORITHM", ["zstd", "br", "gzip", "deflate"]),
+    ("COMPRESS_ALGORITHM_STREAMING", ["zstd", "br", "deflate"]),  # no gzip
+)
+
+
+class _Network(NamedTuple):
+    """How to compress the responses sent to a class of network."""
+
+    enabled_algorithms: tuple[str, ...]
+    streaming_algorithms: tuple[str, ...]
+    config: Mapping[str, Any]
+    # Same, with the cheapest levels of the adaptive `FAST` mode
+    fast_config: Mapping[str, Any]
+
+
+def _compile_networks(options: Mapping[str, Any]) -> Mapping[str | None, _Network]:
+    """
+    Return the negotiation of each class of network, `None` for the clients
+    without hint, from the `COMPRESS_*` options.
+    """
+    enabled_algorithms = _format(options["COMPRESS_ALGORITHM"])
+    streaming_algorithms = _format(options["COMPRESS_ALGORITHM_STREAMING"])
+    networks: dict[str | None, _Network] = {
+        None: _Network(
+            enabled_algorithms,
+            streaming_algorithms,
+            MappingProxyType(dict(options)),
+            MappingProxyType({**options, **FAST_LEVELS}),
+        )
+    }
+    for network in NETWORKS:
+        preferred = _format(options[f"COMPRESS_{network.upper()}_NETWORK_ALGORITHM"])
+        levels = options[f"COMPRESS_{network.upper()}_NETWORK_LEVELS"]
+        networks[network] = _Network(
+            prefer(enabled_algorithms, preferred),
+            prefer(streaming_algorithms, preferred),
+            MappingProxyType({**options, **levels}),
+            MappingProxyType({**options, **levels, **FAST_LEVELS}),
+        )
+    return MappingProxyType(networks)
+
+
+def _mimetype_option_names() -> set[str]:
+    """
+    Return the options which `COMPRESS_MIMETYPE_OPTIONS` can override: the
+    orders of the algorithms, the options of the codecs and the negotiation
+    of the networks, which are compiled per mimetype.
+    """
+    return {
+        "COMPRESS_ALGORITHM",
+        "COMPRESS_ALGORITHM_STREAMING",
+        *level_keys(),
+        *(name for name, _ in _DEFAULTS if name.startswith("COMPRESS_BR_")),
+        *(
+            f"COMPRESS_{network.upper()}_NETWORK_{option}"
+            for network in NETWORKS
+            for option in ("ALGORITHM", "LEVELS")
+        ),
+    }
+
+
+def _mimetype_options(
+    table: Mapping[str, Mapping[str, Any]], mimetypes: Iterable[str]
+) -> dict[str, dict[str, Any]]:
+    """
+    Resolve the patterns of `COMPRESS_MIMETYPE_OPTIONS` for each mimetype,
+    merging the options of the matching patterns, from the least specific
+    one to the most specific one.
+
+    >>> _mimetype_options(
+    ...     {"application/*": {"COMPRESS_LEVEL": 5},
+    ...      "application/*+json": {"COMPRESS_BR_LEVEL": 6}},
+    ...     ["application/json", "application/vnd.api+json", "text/html"],
+    ... )  # doctest: +NORMALIZE_WHITESPACE
+    {'application/json': {'COMPRESS_LEVEL': 5},
+     'application/vnd.api+json': {'COMPRESS_LEVEL': 5, 'COMPRESS_BR_LEVEL': 6}}
+    """
+    allowed = _mimetype_option_names()
+    for pattern, overrides in table.items():
+        for name in overrides:
+            if name not in allowed:
+                raise ValueError(
+                    f"Invalid option of {pattern!r} in COMPRESS_MIMETYPE_OPTIONS: "
+                    f"{name}"
+                )
+    # Fewer wildcards, then longer patterns, are more specific
+    patterns = sorted(table, key=lambda pattern: (-pattern.count("*"), len(pattern)))
+    options = {}
+    for mimetype in mimetypes:
+        merged: dict[str, Any] = {}
+        for pattern in patterns:
+            if fnmatch.fnmatchcase(mimetype, pattern):
+                merged.update(table[pattern])
+        if merged:
+            options[mimetype] = merged
+    return options
+
+
+class _Settings(NamedTuple):
+    """
+    Settings of an application, compiled from its config by
+    :meth:`Compress.init_app` and stored in ``app.extensions["compress"]``.
+    """
+
+    compress: Compress
+    # Read-only copy of the `COMPRESS_*` options, passed to the codecs
+    config: Mapping[str, Any]
+    stream_budget: StreamBudget | None
+    compress_mimetypes_set: frozenset[str]
+    enabled_algorithms: tuple[str, ...]
+    streaming_algorithms: tuple[str, ...]
+    streaming_endpoint_with_conditional: frozenset[str]
+    min_size: int
+    streams: bool
+    evaluate_conditional: bool
+    cache: CacheBackend | AsyncCacheBackend | None
+    cache_key: Callable[..., str] | None
+    cache_fill_all: bool
+    cache_response: bool
+    cache_tags: bool
+    # Levels of the background recompression of the cache misses, if enabled
+    recompress_levels: Mapping[str, Any] | None
+    tuner: AdaptiveTuner | None
+    profiler: Profiler
+    profile: bool
+    profile_token: str | None
+    tracer: Tracer
+    request_algorithms: frozenset[str]
+    request_max_size: int | None
+    client_hints: bool
+    # Negotiation of each class of network, `None` for the clients without hint
+    networks: Mapping[str | None, _Network]
+    # Same, for the mimetypes tuned by `COMPRESS_MIMETYPE_OPTIONS`
+    mimetypes: Mapping[str, Mapping[str | None, _Network]]
+    precompressed: bool
+    # Header handing the transfer of the precompressed files to the server
+    sendfile: str | None
+    # Directories of the files and their URI prefix, the longest first
+    sendfile_locations: tuple[tuple[str, str], ...]
+
+
+class _Plan(NamedTuple):
+    """How to compress a response."""
+
+    algorithm: str
+    evaluate_conditional: bool
+    settings: _Settings
+    # Mapping of `COMPRESS_*` options, which may override the app config
+    config: Mapping[str, Any]
+    # Class of network of the client, from its hints
+    network: str | None
+    # Mode chosen by the adaptive tuner, if any
+    mode: int | None
+    # Profile of the request, timing the stages of the compression
+    profile: Profile
+    # OpenTelemetry span of the compression of the response
+    span: Span
+    # Memory reserved for the compressor of a streamed response, if any
+    reservation: Reservation | None
+    # Precompressed file sent instead of compressing, if any
+    path: str | None
+
+
 class Compress:
     """
     The Compress object allows your application to use Flask-Compress.
@@ -128,17 +575,13 @@ class Compress:
     :class:`flask.Flask` application object if it is ready. Otherwise,
     you may provide it later by using the :meth:`init_app` method.
 
+    The same object can be initialised with several applications, each one
+    using its own config.
+
     :param app: optional :class:`flask.Flask` application object
     :type app: :class:`flask.Flask` or None
     """
 
-    cache: CacheBackend | None
-    cache_key: Callable[..., str] | None
-    compress_mimetypes_set: set[str]
-    enabled_algorithms: tuple[str, ...]
-    streaming_algorithms: tuple[str, ...]
-    streaming_endpoint_with_conditional: set[str]
-
     def __init__(self, app: Flask | None = None) -> None:
         """
         An alternative way to pass your :class:`flask.Flask` application
@@ -148,135 +591,496 @@ class Compress:
         :param app: the :class:`flask.Flask` application object.
         """
         self.app = app
+        self._apps: weakref.WeakSet[Flask] = weakref.WeakSet()
+        self._executor: ThreadPoolExecutor | None = None
+        self._background_jobs = 0
+        # Cache backends and keys of the recompressions not done yet
+        self._recompressing: set[tuple[int, str]] = set()
+        self._background_lock = threading.Lock()
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app: Flask) -> None:
-        defaults = [
+        for k, v in _DEFAULTS:
+            app.config.setdefault(k, copy.copy(v))
+
+        app.extensions["compress"] = self._compile(app)
+        self._apps.add(app)
+        app.cli.add_command(cli)
+
+        if app.config["COMPRESS_REGISTER"] and app.config["COMPRESS_MIMETYPES"]:
+            app.before_request(self.before_request)
+            app.after_request(self.after_request)
+
+    def _compile(self, app: Flask) -> _Settings:
+        """
+        Compile the config of the application, which is read once, so changes
+        made to it after :meth:`init_app` are ignored.
+        """
+        config = app.config
+        options = {k: v for k, v in config.items() if k.startswith("COMPRESS_")}
+        networks = _compile_networks(options)
+        mimetypes = {
+            mimetype: _compile_networks({**options, **overrides})
+            for mimetype, overrides in _mimetype_options(
+                config["COMPRESS_MIMETYPE_OPTIONS"], config["COMPRESS_MIMETYPES"]
+            ).items()
+        }
+        request_algorithms = frozenset(_format(config["COMPRESS_REQUEST_ALGORITHM"]))
+        load_codecs(
+            {
+                *request_algorithms,
+                *(
+                    algorithm
+                    for negotiation in (networks, *mimetypes.values())
+                    for algorithm in (
+                        *negotiation[None].enabled_algorithms,
+                        *negotiation[None].streaming_algorithms,
+                    )
+                ),
+            }
+        )
+
+        sendfile = config["COMPRESS_SENDFILE"]
+        if sendfile is not None:
+            try:
+                sendfile = _SENDFILE_HEADERS[sendfile.lower()]
+            except KeyError:
+                raise ValueError(f"Unknown COMPRESS_SENDFILE header: {sendfile}")
+        locations = sorted(
             (
-                "COMPRESS_MIMETYPES",
-                [
-                    "text/html",
-                    "text/css",
-                    "text/plain",
-                    "text/xml",
-                    "text/x-component",
-                    "text/javascript",  # Obsolete (RFC 9239)
-                    "application/x-javascript",
-                    "application/javascript",
-                    "application/json",
-                    "application/manifest+json",
-                    "application/vnd.api+json",
-                    "application/xml",
-                    "application/xhtml+xml",
-                    "application/rss+xml",
-                    "application/atom+xml",
-                    "application/vnd.ms-fontobject",
-                    "application/x-font-ttf",
-                    "application/x-font-opentype",
-                    "application/x-font-truetype",
-                    "image/svg+xml",
-                    "image/x-icon",
-                    "image/vnd.microsoft.icon",
-                    "font/ttf",
-                    "font/eot",
-                    "font/otf",
-                    "font/opentype",
-                ],
+                (os.path.join(os.path.abspath(directory), ""), prefix)
+                for directory, prefix in config["COMPRESS_SENDFILE_LOCATIONS"].items()
             ),
-            ("COMPRESS_LEVEL", 6),
-            ("COMPRESS_BR_LEVEL", 4),
-            ("COMPRESS_BR_MODE", 0),
-            ("COMPRESS_BR_WINDOW", 22),
-            ("COMPRESS_BR_BLOCK", 0),
-            ("COMPRESS_ZSTD_LEVEL", 3),
-            ("COMPRESS_DEFLATE_LEVEL", -1),
-            ("COMPRESS_MIN_SIZE", 500),
-            ("COMPRESS_CACHE_KEY", None),
-            ("COMPRESS_CACHE_BACKEND", None),
-            ("COMPRESS_REGISTER", True),
-            ("COMPRESS_STREAMS", True),
-            ("COMPRESS_EVALUATE_CONDITIONAL_REQUEST", True),
-            ("COMPRESS_STREAMING_ENDPOINT_CONDITIONAL", ["static"]),
-            ("COMPRESS_ALGORITHM", ["zstd", "br", "gzip", "deflate"]),
-            ("COMPRESS_ALGORITHM_STREAMING", ["zstd", "br", "deflate"]),  # no gzip
-        ]
+            key=lambda location: len(location[0]),
+            reverse=True,
+        )
+
+        backend = config["COMPRESS_CACHE_BACKEND"]
+        budget = config["COMPRESS_STREAM_MEMORY_BUDGET"]
+        tuner = None
+        if config["COMPRESS_ADAPTIVE"]:
+            tuner = AdaptiveTuner(
+                config["COMPRESS_ADAPTIVE_THRESHOLD"],
+                config["COMPRESS_ADAPTIVE_WINDOW"],
+                config["COMPRESS_ADAPTIVE_RESAMPLE"],
+            )
+
+        return _Settings(
+            compress=self,
+            config=networks[None].config,
+            stream_budget=None if budget is None else StreamBudget(budget),
+            compress_mimetypes_set=frozenset(config["COMPRESS_MIMETYPES"]),
+            enabled_algorithms=networks[None].enabled_algorithms,
+            streaming_algorithms=networks[None].streaming_algorithms,
+            streaming_endpoint_with_conditional=frozenset(
+                config["COMPRESS_STREAMING_ENDPOINT_CONDITIONAL"]
+            ),
+            min_size=config["COMPRESS_MIN_SIZE"],
+            streams=config["COMPRESS_STREAMS"],
+            evaluate_conditional=config["COMPRESS_EVALUATE_CONDITIONAL_REQUEST"],
+            cache=backend() if backend else None,
+            cache_key=config["COMPRESS_CACHE_KEY"],
+            cache_fill_all=config["COMPRESS_CACHE_FILL_ALL"],
+            cache_response=config["COMPRESS_CACHE_RESPONSE"],
+            cache_tags=config["COMPRESS_CACHE_TAGS"],
+            recompress_levels=(
+                MappingProxyType(dict(config["COMPRESS_CACHE_RECOMPRESS_LEVELS"]))
+                if config["COMPRESS_CACHE_RECOMPRESS"]
+                else None
+            ),
+            tuner=tuner,
+            profiler=Profiler(
+                config["COMPRESS_PROFILE_INTERVAL"],
+                config["COMPRESS_PROFILE_TRACEMALLOC"],
+                config["COMPRESS_PROFILE_CALLBACK"],
+            ),
+            profile=config["COMPRESS_PROFILE"],
+            profile_token=config["COMPRESS_PROFILE_TOKEN"],
+            tracer=Tracer(
+                config["COMPRESS_TRACING"], config["COMPRESS_TRACER_PROVIDER"]
+            ),
+            request_algorithms=request_algorithms,
+            request_max_size=config["COMPRESS_REQUEST_MAX_SIZE"],
+            client_hints=config["COMPRESS_CLIENT_HINTS"],
+            networks=networks,
+            mimetypes=MappingProxyType(mimetypes),
+            precompressed=config["COMPRESS_PRECOMPRESSED"],
+            sendfile=sendfile,
+            sendfile_locations=tuple(locations),
+        )
+
+    def _settings(self, app: Flask | None = None) -> _Settings:
+        """
+        Return the settings of `app`, defaulting to the current application,
+        or to the application given at initialisation outside of a context.
+        """
+        if app is None:
+            app = current_app if has_app_context() or self.app is None else self.app
+        settings: _Settings = app.extensions["compress"]
+        return settings
+
+    def _override(self, **changes: Any) -> None:
+        """Replace settings of all the applications of this object."""
+        for app in self._apps:
+            app.extensions["compress"] = app.extensions["compress"]._replace(**changes)
+
+    @property
+    def cache(self) -> CacheBackend | AsyncCacheBackend | None:
+        """
+        Cache backend of the current application. Setting it replaces the
+        backend of every application initialised with this object.
+        """
+        return self._settings().cache
+
+    @cache.setter
+    def cache(self, cache: CacheBackend | AsyncCacheBackend | None) -> None:
+        self._override(cache=cache)
+
+    @property
+    def cache_key(self) -> Callable[..., str] | None:
+        """
+        Cache key function of the current application. Setting it replaces
+        the function of every application initialised with this object.
+        """
+        return self._settings().cache_key
+
+    @cache_key.setter
+    def cache_key(self, cache_key: Callable[..., str] | None) -> None:
+        self._override(cache_key=cache_key)
+
+    @property
+    def compress_mimetypes_set(self) -> frozenset[str]:
+        return self._settings().compress_mimetypes_set
+
+    @property
+    def enabled_algorithms(self) -> tuple[str, ...]:
+        return self._settings().enabled_algorithms
+
+    @property
+    def streaming_algorithms(self) -> tuple[str, ...]:
+        return self._settings().streaming_algorithms
+
+    @property
+    def streaming_endpoint_with_conditional(self) -> frozenset[str]:
+        return self._settings().streaming_endpoint_with_conditional
+
+    @property
+    def stream_budget(self) -> StreamBudget | None:
+        return self._settings().stream_budget
 
-        for k, v in defaults:
-            app.config.setdefault(k, v)
+    @property
+    def tuner(self) -> AdaptiveTuner | None:
+        return self._settings().tuner
 
-        backend = app.config["COMPRESS_CACHE_BACKEND"]
-        self.cache = backend() if backend else None
-        self.cache_key = app.config["COMPRESS_CACHE_KEY"]
+    @property
+    def profiler(self) -> Profiler:
+        return self._settings().profiler
 
-        self.compress_mimetypes_set = set(app.config["COMPRESS_MIMETYPES"])
-        self.enabled_algorithms = _format(app.config["COMPRESS_ALGORITHM"])
-        self.streaming_algorithms = _format(app.config["COMPRESS_ALGORITHM_STREAMING"])
-        self.streaming_endpoint_with_conditional = set(
-            app.config["COMPRESS_STREAMING_ENDPOINT_CONDITIONAL"]
+    def before_request(self) -> Response | None:
+        """
+        Decompress the body of the request with `COMPRESS_REQUEST_ALGORITHM`,
+        and return the cached compressed response of the request, if any,
+        which skips the view, with `COMPRESS_CACHE_RESPONSE`.
+        """
+        settings = self._settings(current_app)
+        cache = None if settings.cache is None else _cache_for(settings)
+        return run(cache, self._before_request(settings))
+
+    async def async_before_request(self) -> Response | None:
+        """Same as :meth:`before_request`, awaiting the cache backend."""
+        settings = self._settings(current_app)
+        cache = None if settings.cache is None else _async_cache_for(settings)
+        return await async_run(cache, self._before_request(settings))
+
+    def _before_request(self, settings: _Settings) -> Steps[Response | None]:
+        self._decompress_request(settings)
+        key = self._response_cache_key(settings)
+        if key is not None:
+            entry = yield ("get", key)
+            if entry is not None:
+                response = self._load_response(settings, entry)
+                if response is not None:
+                    return response
+        if settings.cache is not None and settings.cache_tags:
+            # The entries are stored with the tokens read before the view, so
+            # that an invalidation while it runs drops them
+            yield ("read_tokens",)
+        return None
+
+    @staticmethod
+    def _decompress_request(settings: _Settings) -> None:
+        """
+        Replace the stream of a request body compressed with one of the
+        `COMPRESS_REQUEST_ALGORITHM`, so that it is decompressed as it is read.
+        """
+        encoding = request.headers.get("Content-Encoding")
+        if not encoding or not settings.request_algorithms:
+            return
+        algorithm = encoding.strip().lower()
+        if algorithm == "identity":
+            return
+        if algorithm not in settings.request_algorithms:
+            raise UnsupportedMediaType(
+                f"Unsupported Content-Encoding of the request body: {encoding}"
+            )
+
+        stream = DecompressingStream(
+            request.stream,
+            get_codec(algorithm).decompressor(),
+            settings.request_max_size,
         )
+        request.stream = io.BufferedReader(stream)
+        # The headers now describe the decompressed body, of unknown length
+        request.environ.pop("HTTP_CONTENT_ENCODING", None)
+        request.environ.pop("CONTENT_LENGTH", None)
+        request.__dict__.pop("content_length", None)
 
-        if app.config["COMPRESS_REGISTER"] and app.config["COMPRESS_MIMETYPES"]:
-            app.after_request(self.after_request)
+    def _response_cache_key(self, settings: _Settings) -> str | None:
+        """
+        Return the key of the cached response of the request, from the
+        algorithm negotiated before the view, whose mimetype is unknown.
+        """
+        if (
+            not settings.cache_response
+            or settings.cache is None
+            or request.method not in ("GET", "HEAD")
+        ):
+            return None
+        network = self._network(settings)
+        accept_encoding = request.headers.get("Accept-Encoding", "")
+        chosen_algorithm = _choose_algorithm(
+            settings.networks[network].enabled_algorithms, accept_encoding
+        )
+        if chosen_algorithm is None:
+            return None
+        _, key = self._cache_keys(settings, chosen_algorithm, network)
+        return f"response;{key}"
+
+    def _storable_response_key(self, settings: _Settings) -> str | None:
+        """
+        Return the key storing the response of the request, unless the view
+        read the session, for which Flask adds `Vary: Cookie` to the response
+        after the `after_request` functions.
+        """
+        if (
+            not current_app.session_interface.is_null_session(session)
+            and session.accessed
+        ):
+            return None
+        return self._response_cache_key(settings)
+
+    @staticmethod
+    def _dump_response(response: Response, compressed_content: bytes) -> bytes | None:
+        """
+        Serialize a compressed response for `COMPRESS_CACHE_RESPONSE`, or
+        return `None` if it must not be cached, e.g. when it varies on the
+        `Cookie` header, as when the view reads the session.
+        """
+        if (
+            response.status_code != 200
+            or "Set-Cookie" in response.headers
+            or response.cache_control.no_store
+            or response.cache_control.private
+            or any(name.lower() not in _CACHEABLE_VARY for name in response.vary)
+        ):
+            return None
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() in _CACHED_RESPONSE_HEADERS
+        ]
+        return json.dumps(headers).encode() + b"\n" + compressed_content
+
+    @staticmethod
+    def _load_response(settings: _Settings, entry: bytes) -> Response | None:
+        """
+        Deserialize a cached response, or return `None` if the client does
+        not accept its encoding, negotiated for its mimetype by another client.
+        """
+        headers, _, compressed_content = entry.partition(b"\n")
+        response = current_app.response_class(
+            compressed_content, headers=json.loads(headers)
+        )
+        if settings.mimetypes:
+            encoding = response.headers["Content-Encoding"]
+            accept_encoding = request.headers.get("Accept-Encoding", "")
+            if _choose_algorithm((encoding,), accept_encoding) != encoding:
+                return None
+        if settings.evaluate_conditional:
+            response.make_conditional(request)
+        return response
 
     def after_request(self, response: Response) -> Response:
-        app = self.app or current_app
+        settings = self._settings(current_app)
+        cache = None if settings.cache is None else _cache_for(settings)
+        return run(cache, self._after_request(settings, response))
+
+    async def async_after_request(self, response: Response) -> Response:
+        """
+        Same as :meth:`after_request`, awaiting the cache backend, which can
+        be either a :class:`CacheBackend` or an :class:`AsyncCacheBackend`.
+        """
+        settings = self._settings(current_app)
+        cache = None if settings.cache is None else _async_cache_for(settings)
+        return await async_run(cache, self._after_request(settings, response))
+
+    def _after_request(
+        self, settings: _Settings, response: Response
+    ) -> Steps[Response]:
+        """
+        Compress the response, yielding the operations on the cache backend
+        to :meth:`after_request` or :meth:`async_after_request`.
+        """
+        profile = self._begin_profile(settings)
+        try:
+            with settings.tracer.span("flask_compress.compress") as span:
+                with profile.stage("prepare"):
+                    plan = self._prepare(settings, response, profile, span)
+                if plan is None:
+                    return response
+
+                if (
+                    response.is_streamed
+                    or settings.cache is None
+                    or plan.path is not None
+                ):
+                    self._compress(response, plan)
+                else:
+                    base_key, key = self._cache_keys(
+                        settings, plan.algorithm, plan.network
+                    )
+                    if settings.cache_tags:
+                        # Before any background job takes them
+                        yield ("read_tokens",)
+                    with profile.stage("cache_get"):
+                        compressed_content: bytes | None = yield ("get", key)
+                    span.set_attribute(
+                        "flask_compress.cache_hit", compressed_content is not None
+                    )
+                    if compressed_content is None:
+                        compressed_content = self._compress(response, plan, base_key)
+                        # Only on a miss, not to replace a recompressed entry
+                        with profile.stage("cache_set"):
+                            yield ("set", key, compressed_content)
+                    else:
+                        span.set_attribute(
+                            "flask_compress.output_bytes", len(compressed_content)
+                        )
+                        with profile.stage("set_data"):
+                            self._set_compressed_data(response, compressed_content)
+
+                    with profile.stage("cache_set"):
+                        response_key = self._storable_response_key(settings)
+                        if response_key is not None:
+                            entry = self._dump_response(response, compressed_content)
+                            if entry is not None:
+                                yield ("set", response_key, entry)
+
+                if plan.evaluate_conditional:
+                    with profile.stage("conditional"):
+                        response.make_conditional(request)
+
+                return response
+        finally:
+            profile.finish()
+
+    @staticmethod
+    def _begin_profile(settings: _Settings) -> Profile:
+        """
+        Start the profile of the request, which does nothing unless profiling
+        is enabled by `COMPRESS_PROFILE`, or by the `X-Compress-Profile`
+        header carrying `COMPRESS_PROFILE_TOKEN`.
+        """
+        enabled = settings.profile
+        token = settings.profile_token
+        if not enabled and token:
+            value = request.headers.get(PROFILE_HEADER)
+            enabled = value is not None and hmac.compare_digest(value, token)
+        return settings.profiler.begin(enabled)
+
+    def _prepare(
+        self, settings: _Settings, response: Response, profile: Profile, span: Span
+    ) -> _Plan | None:
+        """
+        Negotiate the compression of the response, and answer the conditional
+        requests matching its compressed representation.
 
-        vary = response.headers.get("Vary")
-        if not vary:
-            response.headers["Vary"] = "Accept-Encoding"
-        elif "accept-encoding" not in vary.lower():
-            response.headers["Vary"] = f"{vary}, Accept-Encoding"
+        :return: how to compress the response, or `None` if the response is
+            to be returned as is.
+        """
+        _vary_accept_encoding(response.headers)
+        if settings.client_hints:
+            for name in HINT_HEADERS:
+                _add_to_header(response.headers, "Vary", name)
+            _add_to_header(response.headers, "Accept-CH", ACCEPT_CH)
+        network = self._network(settings)
+        negotiation = _negotiation(settings, response.mimetype, network)
 
         accept_encoding = request.headers.get("Accept-Encoding", "")
-        streaming_compressed = response.is_streamed and app.config["COMPRESS_STREAMS"]
+        streaming_compressed = response.is_streamed and settings.streams
         streaming_conditional = response.is_streamed and (
-            request.endpoint in self.streaming_endpoint_with_conditional
+            request.endpoint in settings.streaming_endpoint_with_conditional
         )
         algorithms = (
-            self.streaming_algorithms
+            negotiation.streaming_algorithms
             if streaming_compressed
-            else self.enabled_algorithms
+            else negotiation.enabled_algorithms
         )
         chosen_algorithm = _choose_algorithm(algorithms, accept_encoding)
+        path = None
+        if settings.precompressed and response.status_code == 200:
+            # Looked up only for the responses which could be compressed,
+            # whose variants are negotiated as buffered responses
+            buffered_algorithm = _choose_algorithm(
+                negotiation.enabled_algorithms, accept_encoding
+            )
+            if self._skip_reason(settings, response, buffered_algorithm, True) is None:
+                variant = self._precompressed_file(
+                    negotiation.enabled_algorithms, accept_encoding
+                )
+                if variant is not None:
+                    chosen_algorithm, path = variant
+
+        reason = self._skip_reason(
+            settings, response, chosen_algorithm, path is not None
+        )
+        if reason is not None:
+            span.set_attribute("flask_compress.skip_reason", reason)
+            return None
+        assert chosen_algorithm is not None
 
+        config = negotiation.config
+        mode = None
         if (
-            chosen_algorithm is None
-            or response.mimetype not in self.compress_mimetypes_set
-            or response.status_code < 200
-            or response.status_code >= 300
-            or (response.is_streamed and not app.config["COMPRESS_STREAMS"])
-            or "Content-Encoding" in response.headers
-            or (
-                response.content_length is not None
-                and response.content_length < app.config["COMPRESS_MIN_SIZE"]
-            )
+            settings.tuner is not None
+            and not response.is_streamed
+            and request.endpoint is not None
         ):
-            return response
-
-        response.direct_passthrough = False
-        response.headers["Content-Encoding"] = chosen_algorithm
-
-        if streaming_compressed:
-            chunks = response.iter_encoded()
-            _gen_compressed_content = _compress_chunks(app, chunks, chosen_algorithm)
-            response.response = stream_with_context(_gen_compressed_content)
-            response.headers.pop("Content-Length", None)
-        else:
-            if self.cache is not None:
-                assert self.cache_key is not None
-                key = f"{chosen_algorithm};{self.cache_key(request)}"
-                compressed_content = self.cache.get(key)
-                if compressed_content is None:
-                    data = response.get_data()
-                    compressed_content = _compress_data(app, data, chosen_algorithm)
-                self.cache.set(key, compressed_content)
-            else:
-                data = response.get_data()
-                compressed_content = _compress_data(app, data, chosen_algorithm)
-
-            response.set_data(compressed_content)
-            response.headers["Content-Length"] = response.content_length
+            mode = settings.tuner.choose(request.endpoint)
+            if mode == SKIP:
+                span.set_attribute("flask_compress.skip_reason", "adaptive")
+                return None
+            if mode == FAST:
+                config = negotiation.fast_config
+            elif network is not None and mode == NORMAL:
+                # Compressed with the levels of the network, which would
+                # mislead the tuner
+                mode = None
+
+        reservation = None
+        if response.is_streamed and settings.stream_budget is not None and path is None:
+            reserved = self._reserve_stream(
+                settings.stream_budget,
+                config,
+                algorithms,
+                accept_encoding,
+                chosen_algorithm,
+            )
+            if reserved is None:
+                span.set_attribute("flask_compress.skip_reason", "stream_budget")
+                return None
+            chosen_algorithm, config, reservation = reserved
 
         # "123456789"   => "123456789:gzip"   - A strong ETag validator
         # W/"123456789" => W/"123456789:gzip" - A weak ETag validator
@@ -285,19 +1089,401 @@ class Compress:
         if etag and not is_weak:
             response.set_etag(f"{etag}:{chosen_algorithm}", weak=False)
 
-        if (
-            app.config["COMPRESS_EVALUATE_CONDITIONAL_REQUEST"]
+        evaluate_conditional = (
+            settings.evaluate_conditional
             and request.method in ("GET", "HEAD")
             and (not response.is_streamed or streaming_conditional)
+        )
+
+        # Answer matching conditional requests before compressing anything,
+        # the compressed representation is identified by the suffixed ETag.
+        if evaluate_conditional and not is_resource_modified(
+            request.environ,
+            response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
         ):
-            response.make_conditional(request)
+            if parse_etags(request.environ.get("HTTP_IF_MATCH")):
+                response.status_code = 412
+            else:
+                response.status_code = 304
+            if reservation is not None:
+                reservation.release()
+            span.set_attribute("flask_compress.skip_reason", "not_modified")
+            return None
 
-        return response
+        response.direct_passthrough = False
+        response.headers["Content-Encoding"] = chosen_algorithm
+        _set_codec_attributes(span, chosen_algorithm, config)
+        if path is not None:
+            span.set_attribute("flask_compress.precompressed", True)
+
+        return _Plan(
+            chosen_algorithm,
+            evaluate_conditional,
+            settings,
+            config,
+            network,
+            mode,
+            profile,
+            span,
+            reservation,
+            path,
+        )
+
+    @staticmethod
+    def _skip_reason(
+        settings: _Settings,
+        response: Response,
+        algorithm: str | None,
+        precompressed: bool = False,
+    ) -> str | None:
+        """Return why the response is not to be compressed, if it is not."""
+        if algorithm is None:
+            return "not_accepted"
+        if response.mimetype not in settings.compress_mimetypes_set:
+            return "mimetype"
+        if response.status_code < 200 or response.status_code >= 300:
+            return "status"
+        if response.is_streamed and not settings.streams and not precompressed:
+            return "streamed"
+        if "Content-Encoding" in response.headers:
+            return "encoded"
+        if (
+            response.content_length is not None
+            and response.content_length < settings.min_size
+        ):
+            return "min_size"
+        return None
+
+    @staticmethod
+    def _static_file() -> str | None:
+        """
+        Return the path of the file of a request to the static endpoint of
+        the application or of a blueprint, if any.
+        """
+        endpoint = request.endpoint
+        if endpoint is None or not request.view_args:
+            return None
+        blueprint, _, name = endpoint.rpartition(".")
+        filename = request.view_args.get("filename")
+        if name != "static" or not isinstance(filename, str):
+            return None
+        scaffold = current_app.blueprints.get(blueprint) if blueprint else current_app
+        folder = None if scaffold is None else scaffold.static_folder
+        if folder is None:
+            return None
+        return safe_join(folder, filename)
+
+    @classmethod
+    def _precompressed_file(
+        cls, algorithms: tuple[str, ...], accept_encoding: str
+    ) -> tuple[str, str] | None:
+        """
+        Negotiate the precompressed variants of the requested static file,
+        e.g. `app.js.br` next to `app.js`, with `COMPRESS_PRECOMPRESSED`.
+
+        :return: the algorithm and path of the variant, or `None` if there is
+            no variant accepted by the client.
+        """
+        path = cls._static_file()
+        if path is None:
+            return None
+        variants = {}
+        for algorithm in algorithms:
+            extension = get_codec(algorithm).extension
+            if extension is not None and os.path.isfile(path + extension):
+                variants[algorithm] = path + extension
+        if not variants:
+            return None
+        chosen_algorithm = _choose_algorithm(tuple(variants), accept_encoding)
+        if chosen_algorithm is None:
+            return None
+        return chosen_algorithm, variants[chosen_algorithm]
+
+    @staticmethod
+    def _reserve_stream(
+        budget: StreamBudget,
+        config: Mapping[str, Any],
+        algorithms: tuple[str, ...],
+        accept_encoding: str,
+        algorithm: str,
+    ) -> tuple[str, Mapping[str, Any], Reservation] | None:
+        """
+        Reserve the memory of the compressor of a streamed response, falling
+        back to cheaper options, then to the other algorithms accepted by the
+        client, when the budget is tight.
+
+        :return: the algorithm, options and reservation of the compressor, or
+            `None` if the response is not to be compressed.
+        """
+        remaining = list(algorithms)
+        chosen: str | None = algorithm
+        while chosen is not None:
+            codec = get_codec(chosen)
+            for overrides in ({}, *codec.reductions(config)):
+                candidate = {**config, **overrides} if overrides else config
+                reservation = budget.reserve(
+                    codec.memory(candidate),
+                    degraded=bool(overrides) or chosen != algorithm,
+                )
+                if reservation is not None:
+                    return chosen, candidate, reservation
+            remaining.remove(chosen)
+            chosen = _choose_algorithm(tuple(remaining), accept_encoding)
+        budget.reject()
+        return None
+
+    @staticmethod
+    def _network(settings: _Settings) -> str | None:
+        """Return the class of network of the client, with `COMPRESS_CLIENT_HINTS`."""
+        return network_class(request.headers) if settings.client_hints else None
+
+    @staticmethod
+    def _cache_keys(
+        settings: _Settings, algorithm: str, network: str | None = None
+    ) -> tuple[str, str]:
+        """
+        Return the cache key of the request, and the one of `algorithm`, which
+        also depends on the class of network, compressed with other levels.
+        """
+        assert settings.cache_key is not None
+        base_key = settings.cache_key(request)
+        return base_key, f"{_variant(algorithm, network)};{base_key}"
+
+    def _compress(
+        self, response: Response, plan: _Plan, base_key: str | None = None
+    ) -> bytes:
+        """
+        Compress the response as planned, chunk by chunk for streamed
+        responses.
+
+        :param base_key: cache key of the request, used to fill the cache for
+            the other algorithms with `COMPRESS_CACHE_FILL_ALL`, and to
+            recompress the response with `COMPRESS_CACHE_RECOMPRESS`
+        :return: the compressed data, only when it is to be cached
+        """
+        if plan.path is not None:
+            self._send_file(response, plan.settings, plan.path)
+            return b""
+
+        if response.is_streamed:
+            chunks = response.iter_encoded()
+            # Ended when the response is closed, after the span of the response
+            span = plan.settings.tracer.start("flask_compress.compress_stream")
+            _set_codec_attributes(span, plan.algorithm, plan.config)
+            response.call_on_close(span.end)
+            _gen_compressed_content = _compress_chunks(
+                plan.config, chunks, plan.algorithm, span
+            )
+            if plan.reservation is not None:
+                # Released when the stream ends, or when the response is
+                # closed if it is never consumed.
+                _gen_compressed_content = _release_after(
+                    _gen_compressed_content, plan.reservation
+                )
+                response.call_on_close(plan.reservation.release)
+            response.response = stream_with_context(_gen_compressed_content)
+            response.headers.pop("Content-Length", None)
+            return b""
+
+        # The chunks are compressed as they are, without joining them first,
+        # unless the data is needed for the other algorithms.
+        fill_all = base_key is not None and plan.settings.cache_fill_all
+        with plan.profile.stage("get_data"):
+            data: list[bytes] = (
+                [response.get_data()] if fill_all else list(response.iter_encoded())
+            )
+
+        # A miss is served with the fast levels, then recompressed in the
+        # background, unless the adaptive tuner chose the fast levels anyway
+        config = plan.config
+        recompress = (
+            base_key is not None
+            and plan.settings.recompress_levels is not None
+            and plan.mode != FAST
+        )
+        if recompress:
+            assert base_key is not None
+            config = {**config, **FAST_LEVELS}
+            _set_codec_attributes(plan.span, plan.algorithm, config)
+            self._recompress(response, plan, base_key, data)
+
+        size = sum(len(chunk) for chunk in data)
+        start = time.thread_time()
+        with plan.profile.stage("compress"):
+            compressed_chunks = _compress_sequence(config, data, plan.algorithm)
+        compressed_size = sum(len(chunk) for chunk in compressed_chunks)
+        plan.span.set_attribute("flask_compress.input_bytes", size)
+        plan.span.set_attribute("flask_compress.output_bytes", compressed_size)
+        # The fast levels of a recompressed miss would mislead the tuner
+        if plan.mode is not None and not recompress:
+            tuner = plan.settings.tuner
+            assert tuner is not None and request.endpoint is not None
+            cpu_ms = (time.thread_time() - start) * 1000
+            tuner.record(request.endpoint, plan.mode, size, compressed_size, cpu_ms)
+
+        if fill_all:
+            assert base_key is not None
+            self._fill_cache(plan, base_key, data[0], response.mimetype)
+
+        compressed_content = b""
+        if base_key is not None:
+            # Stored in the cache as a whole
+            compressed_content = b"".join(compressed_chunks)
+            compressed_chunks = [compressed_content]
+        with plan.profile.stage("set_data"):
+            response.response = compressed_chunks
+            response.headers["Content-Length"] = str(compressed_size)
+        return compressed_content
+
+    @staticmethod
+    def _send_file(response: Response, settings: _Settings, path: str) -> None:
+        """
+        Replace the body of the response with the precompressed file at
+        `path`, whose transfer is handed to the server with `COMPRESS_SENDFILE`.
+        """
+        # The original file, opened by the view
+        close = getattr(response.response, "close", None)
+        if close is not None:
+            close()
+        response.headers.pop("X-Sendfile", None)
+        response.headers["Content-Length"] = str(os.path.getsize(path))
+
+        if settings.sendfile == "X-Sendfile":
+            response.headers["X-Sendfile"] = os.path.abspath(path)
+            response.response = []
+            return
+        if settings.sendfile == "X-Accel-Redirect":
+            uri = _sendfile_uri(settings.sendfile_locations, path)
+            if uri is not None:
+                response.headers["X-Accel-Redirect"] = uri
+                response.response = []
+                return
+
+        response.response = wrap_file(request.environ, open(path, "rb"))
+        response.direct_passthrough = True
+
+    @staticmethod
+    def _set_compressed_data(response: Response, compressed_content: bytes) -> None:
+        response.set_data(compressed_content)
+        response.headers["Content-Length"] = response.content_length
+
+    def _fill_cache(
+        self, plan: _Plan, base_key: str, data: bytes, mimetype: str | None
+    ) -> None:
+        """
+        Compress `data` for the enabled algorithms other than the planned one
+        in a background thread, and store them in the cache.
+        """
+        # Built in the request, whose tags are those of the entries
+        cache = _cache_for(plan.settings)
+        config = _background_config(plan.settings, plan.config)
+        network = plan.network
+        algorithms = [
+            algo
+            for algo in _negotiation(
+                plan.settings, mimetype, network
+            ).enabled_algorithms
+            if algo != plan.algorithm
+        ]
+
+        def _fill() -> None:
+            for algorithm in algorithms:
+                key = f"{_variant(algorithm, network)};{base_key}"
+                if cache.get(key) is None:
+                    cache.set(key, _compress_data(config, data, algorithm))
+
+        self._submit(_fill)
+
+    def _recompress(
+        self, response: Response, plan: _Plan, base_key: str, data: list[bytes]
+    ) -> None:
+        """
+        Compress `data` again with `COMPRESS_CACHE_RECOMPRESS_LEVELS` in a
+        background thread, once the response is sent, and replace the cache
+        entries of the response.
+        """
+        key = f"{_variant(plan.algorithm, plan.network)};{base_key}"
+        pending = (id(plan.settings.cache), key)
+        cache = _cache_for(plan.settings)
+        config = _background_config(plan.settings, plan.config)
+        algorithm = plan.algorithm
+        response_key = self._storable_response_key(plan.settings)
+
+        def _recompress() -> None:
+            try:
+                compressed_content = b"".join(
+                    _compress_sequence(config, data, algorithm)
+                )
+                cache.set(key, compressed_content)
+                if response_key is not None:
+                    entry = self._dump_response(response, compressed_content)
+                    if entry is not None:
+                        cache.set(response_key, entry)
+            finally:
+                with self._background_lock:
+                    self._recompressing.discard(pending)
+
+        def _submit() -> None:
+            # Once per entry, for the concurrent misses
+            with self._background_lock:
+                if pending in self._recompressing:
+                    return
+                self._recompressing.add(pending)
+            if not self._submit(_recompress):
+                with self._background_lock:
+                    self._recompressing.discard(pending)
+
+        # Submitted after the fast entries are stored, which must not
+        # replace the recompressed ones
+        response.call_on_close(_submit)
+
+    def _submit(self, job: Callable[[], None]) -> bool:
+        """
+        Run `job` in the background thread, unless `_MAX_BACKGROUND_JOBS` are
+        already waiting, and return whether it was submitted.
+        """
+        with self._background_lock:
+            if self._background_jobs >= _MAX_BACKGROUND_JOBS:
+                return False
+            self._background_jobs += 1
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="flask-compress"
+                )
+            executor = self._executor
+        executor.submit(job).add_done_callback(self._background_job_done)
+        return True
+
+    def _background_job_done(self, future: Future[None]) -> None:
+        with self._background_lock:
+            self._background_jobs -= 1
 
     def compressed(self) -> Callable[..., Callable[..., Any]]:
         def decorator(f: Callable[..., Any]) -> Callable[..., Any]:
+            if inspect.iscoroutinefunction(f):
+                # Compress in the event loop of the view, so that an
+                # asynchronous cache backend overlaps with other work.
+                @functools.wraps(f)
+                async def async_decorated_function(*args: Any, **kwargs: Any) -> Any:
+                    cached_response = await self.async_before_request()
+                    if cached_response is not None:
+                        return cached_response
+
+                    rv = await f(*args, **kwargs)
+                    response = current_app.make_response(rv)
+                    return await self.async_after_request(response)
+
+                return async_decorated_function
+
             @functools.wraps(f)
             def decorated_function(*args: Any, **kwargs: Any) -> Any:
+                cached_response = self.before_request()
+                if cached_response is not None:
+                    return cached_response
+
                 @after_this_request
                 def compressor(response: Response) -> Response:
                     return self.after_request(response)
@@ -308,102 +1494,277 @@ class Compress:
 
         return decorator
 
+    def warm_cache(
+        self,
+        targets: Iterable[str],
+        app: Flask | None = None,
+        base_url: str | None = None,
+        max_workers: int | None = None,
+    ) -> int:
+        """
+        Fill the cache with the compressed responses of URLs or endpoints,
+        typically before the application starts accepting traffic.
+
+        Each target is rendered once through the test client of the
+        application, then compressed with every algorithm of
+        `COMPRESS_ALGORITHM`, in parallel.
+
+        :param targets: URL paths (starting with `/`) or endpoint names
+        :param app: the :class:`flask.Flask` application object, defaults to
+            the current application or the one given at initialisation
+        :param base_url: base URL of the simulated requests, which matters
+            when the cache key depends on the host, e.g. `request.url`
+        :param max_workers: number of threads used to compress the responses
+        :return: the number of compressed responses stored in the cache
+        """
+        if app is None:
+            app = current_app if has_app_context() or self.app is None else self.app
+        settings = self._settings(app)
+        cache_key = settings.cache_key
+        if settings.cache is None or cache_key is None:
+            raise RuntimeError(
+                "Warming the cache requires a cache backend and a cache key."
+            )
 
-def _compress_data(app: Flask, data: bytes, algorithm: str) -> bytes:
-    if algorithm == "zstd":
-        return compression.zstd.compress(  # type: ignore[no-any-return]
-            data, app.config["COMPRESS_ZSTD_LEVEL"]
-        )
+        client = app.test_client()
+        jobs: list[tuple[CacheBackend, str, bytes, str, Mapping[str, Any]]] = []
+        for target in targets:
+            with app.test_request_context(base_url=base_url):
+                path = target if target.startswith("/") else url_for(target)
+
+            # The context of the request is kept until the end of the block,
+            # for the tags of its entries
+            with client:
+                response = client.get(
+                    path, base_url=base_url, headers=[("Accept-Encoding", "identity")]
+                )
+                cache = _cache_for(settings)
+            data = response.get_data()
+            if (
+                response.mimetype not in settings.compress_mimetypes_set
+                or response.status_code < 200
+                or response.status_code >= 300
+                or "Content-Encoding" in response.headers
+                or len(data) < settings.min_size
+            ):
+                continue
+
+            with app.test_request_context(path, base_url=base_url):
+                key = cache_key(request)
+            negotiation = _negotiation(settings, response.mimetype, None)
+            config = _background_config(settings, negotiation.config)
+            jobs.extend(
+                (cache, key, data, algo, config)
+                for algo in negotiation.enabled_algorithms
+            )
 
-    if algorithm == "gzip":
-        return compression.gzip.compress(  # type: ignore[no-any-return]
-            data, app.config["COMPRESS_LEVEL"]
-        )
+        def _compress(
+            job: tuple[CacheBackend, str, bytes, str, Mapping[str, Any]],
+        ) -> tuple[CacheBackend, str, bytes]:
+            cache, key, data, algorithm, config = job
+            return (
+                cache,
+                f"{algorithm};{key}",
+                _compress_data(config, data, algorithm),
+            )
 
-    if algorithm == "deflate":
-        return compression.zlib.compress(  # type: ignore[no-any-return]
-            data, app.config["COMPRESS_DEFLATE_LEVEL"]
-        )
+        from concurrent.futures import ThreadPoolExecutor
 
-    if algorithm == "br":
-        return brotli.compress(  # type: ignore[no-any-return]
-            data,
-            mode=app.config["COMPRESS_BR_MODE"],
-            quality=app.config["COMPRESS_BR_LEVEL"],
-            lgwin=app.config["COMPRESS_BR_WINDOW"],
-            lgblock=app.config["COMPRESS_BR_BLOCK"],
-        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for cache, key, compressed_content in executor.map(_compress, jobs):
+                cache.set(key, compressed_content)
+
+        return len(jobs)
+
+    def tag(self, *tags: str) -> None:
+        """
+        Tag the entries cached for the current request, on top of the tag of
+        its endpoint, so that :meth:`invalidate` drops them with `tags`.
+
+        Tags are only stored with `COMPRESS_CACHE_TAGS`, with their tokens
+        read by this call, which should therefore come before the content of
+        the response is produced.
+
+        :param tags: names of the tags, e.g. ``"product:42"``
+        """
+        g.setdefault("_compress_tags", []).extend(tags)
+        settings = self._settings(current_app)
+        if settings.cache is not None and settings.cache_tags:
+            cache = _as_sync_cache(settings.cache)
+            TaggedCache(cache, tags, _request_tokens()).read_tokens()
+
+    def invalidate(self, *tags: str, app: Flask | None = None) -> None:
+        """
+        Invalidate the cached entries tagged with any of `tags`, or all the
+        entries without tags, with `COMPRESS_CACHE_TAGS`.
+
+        The entries of an endpoint are tagged with ``"endpoint:<name>"``.
+        Each tag is given a new token in the cache backend, so invalidating
+        takes a single write per tag, whatever the number of entries, which
+        are misses from then on, until replaced.
+
+        :param tags: names of the tags
+        :param app: the :class:`flask.Flask` application object, defaults to
+            the current application or the one given at initialisation
+        """
+        cache = _as_sync_cache(self._tags_cache(app))
+        for tag in tags or (ALL,):
+            cache.set(tag_key(tag), new_token())
+
+    async def async_invalidate(self, *tags: str, app: Flask | None = None) -> None:
+        """Same as :meth:`invalidate`, awaiting the cache backend."""
+        cache = _as_async_cache(self._tags_cache(app))
+        for tag in tags or (ALL,):
+            await cache.set(tag_key(tag), new_token())
+
+    def _tags_cache(self, app: Flask | None) -> CacheBackend | AsyncCacheBackend:
+        settings = self._settings(app)
+        if settings.cache is None or not settings.cache_tags:
+            raise RuntimeError(
+                "Invalidating the cache requires a cache backend and "
+                "COMPRESS_CACHE_TAGS."
+            )
+        return settings.cache
+
+
+def _variant(algorithm: str, network: str | None) -> str:
+    """Name the compressed variant of a response in the cache keys."""
+    return algorithm if network is None else f"{algorithm}.{network}"
+
+
+def _request_tags() -> list[str]:
+    """
+    Return the tags of the entries of the current request: every entry, its
+    endpoint and the ones given to :meth:`Compress.tag`.
+    """
+    tags = [ALL]
+    if request.endpoint is not None:
+        tags.append(endpoint_tag(request.endpoint))
+    tags.extend(g.get("_compress_tags", ()))
+    return list(dict.fromkeys(tags))
+
+
+def _request_tokens() -> dict[str, str]:
+    """
+    Return the tokens of the tags of the current request read so far, shared
+    by its caches, so that the entries stored by the background jobs carry
+    the tokens read during the request.
+    """
+    tokens: dict[str, str] = g.setdefault("_compress_tokens", {})
+    return tokens
+
+
+def _cache_for(settings: _Settings) -> CacheBackend:
+    """
+    Return the cache backend of `settings`, storing the entries with the tags
+    of the current request with `COMPRESS_CACHE_TAGS`.
+    """
+    assert settings.cache is not None
+    cache = _as_sync_cache(settings.cache)
+    if not settings.cache_tags:
+        return cache
+    if not has_request_context():
+        return TaggedCache(cache)
+    return TaggedCache(cache, _request_tags(), _request_tokens())
+
+
+def _async_cache_for(settings: _Settings) -> AsyncCacheBackend:
+    """Same as :func:`_cache_for`, for awaiting the cache backend."""
+    assert settings.cache is not None
+    cache = _as_async_cache(settings.cache)
+    if not settings.cache_tags:
+        return cache
+    if not has_request_context():
+        return AsyncTaggedCache(cache)
+    return AsyncTaggedCache(cache, _request_tags(), _request_tokens())
+
+
+def _negotiation(
+    settings: _Settings, mimetype: str | None, network: str | None
+) -> _Network:
+    """Return how to compress the responses of `mimetype` sent to `network`."""
+    return settings.mimetypes.get(mimetype or "", settings.networks)[network]
+
+
+def _sendfile_uri(locations: Sequence[tuple[str, str]], path: str) -> str | None:
+    """
+    Return the URI of `path` for `X-Accel-Redirect`, from the first of the
+    `COMPRESS_SENDFILE_LOCATIONS` containing it, if any.
+    """
+    path = os.path.abspath(path)
+    for directory, prefix in locations:
+        if path.startswith(directory):
+            relative = path[len(directory) :].replace(os.sep, "/")
+            return prefix.rstrip("/") + "/" + urllib.parse.quote(relative)
+    return None
 
-    raise ValueError(f"Unknown compression algorithm: {algorithm}")
+
+def _background_config(
+    settings: _Settings, config: Mapping[str, Any]
+) -> Mapping[str, Any]:
+    """
+    Return the options of the compressions out of the requests, with the
+    `COMPRESS_CACHE_RECOMPRESS_LEVELS` if enabled.
+    """
+    if settings.recompress_levels is None:
+        return config
+    return {**config, **settings.recompress_levels}
+
+
+def _set_codec_attributes(
+    span: Span, algorithm: str, config: Mapping[str, Any]
+) -> None:
+    span.set_attribute("flask_compress.algorithm", algorithm)
+    level_key = get_codec(algorithm).level_key
+    if level_key is not None:
+        span.set_attribute("flask_compress.level", config[level_key])
+
+
+def _compress_data(config: Mapping[str, Any], data: bytes, algorithm: str) -> bytes:
+    return get_codec(algorithm).compress(data, config)
+
+
+def _compress_sequence(
+    config: Mapping[str, Any], chunks: Sequence[bytes], algorithm: str
+) -> list[bytes]:
+    if len(chunks) == 1:
+        return [_compress_data(config, chunks[0], algorithm)]
+    return get_codec(algorithm).compress_sequence(chunks, config)
 
 
 def _uncompress_data(data: bytes, algorithm: str) -> bytes:
     # This is used for tests purposes only.
-    if algorithm == "zstd":
-        return compression.zstd.decompress(data)  # type: ignore[no-any-return]
-    if algorithm == "gzip":
-        return compression.gzip.decompress(data)  # type: ignore[no-any-return]
-    if algorithm == "deflate":
-        return compression.zlib.decompress(data)  # type: ignore[no-any-return]
-    if algorithm == "br":
-        return brotli.decompress(data)  # type: ignore[no-any-return]
+    return get_codec(algorithm).decompress(data)
 
-    raise ValueError(f"Unknown compression algorithm: {algorithm}")
 
-
-def _compress_chunks(
-    app: Flask, chunks: Iterator[bytes], algorithm: str
+def _release_after(
+    chunks: Iterator[bytes], reservation: Reservation
 ) -> Iterator[bytes]:
-    if algorithm == "zstd":
-        level = app.config["COMPRESS_ZSTD_LEVEL"]
-        compressor = compression.zstd.ZstdCompressor(level=level)
-        for data in chunks:
-            out = compressor.compress(data)
-            if out:
-                yield out
-        out = compressor.flush()
-        if out:
-            yield out
+    try:
+        yield from chunks
+    finally:
+        reservation.release()
 
-    elif algorithm == "gzip":
-        level = app.config["COMPRESS_LEVEL"]
-        compressor = compression.zlib.compressobj(
-            level,
-            compression.zlib.DEFLATED,
-            compression.zlib.MAX_WBITS + 16,
-        )
-        for data in chunks:
-            out = compressor.compress(data)
-            if out:
-                yield out
-        out = compressor.flush()
-        if out:
-            yield out
 
-    elif algorithm == "deflate":
-        level = app.config["COMPRESS_DEFLATE_LEVEL"]
-        compressor = compression.zlib.compressobj(level=level)
+def _compress_chunks(
+    config: Mapping[str, Any],
+    chunks: Iterable[bytes],
+    algorithm: str,
+    span: Span = NULL_SPAN,
+) -> Iterator[bytes]:
+    compressor = get_codec(algorithm).compressor(config)
+    size_in = size_out = 0
+    try:
         for data in chunks:
+            size_in += len(data)
             out = compressor.compress(data)
             if out:
+                size_out += len(out)
                 yield out
         out = compressor.flush()
         if out:
+            size_out += len(out)
             yield out
-
-    elif algorithm == "br":
-        compressor = brotli.Compressor(
-            mode=app.config["COMPRESS_BR_MODE"],
-            quality=app.config["COMPRESS_BR_LEVEL"],
-            lgwin=app.config["COMPRESS_BR_WINDOW"],
-            lgblock=app.config["COMPRESS_BR_BLOCK"],
-        )
-        for data in chunks:
-            out = compressor.process(data)
-            if out:
-                yield out
-        out = compressor.finish()
-        if out:
-            yield out
-    else:
-        raise ValueError(f"Unsupported streaming algorithm: {algorithm}")
+    finally:
+        span.set_attribute("flask_compress.input_bytes", size_in)
+        span.set_attribute("flask_compress.output_bytes", size_out)
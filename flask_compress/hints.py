@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from werkzeug.datastructures import Headers
+
+# Classes of network, from the `Save-Data` and `ECT` client hints
+SLOW, FAST = "slow", "fast"
+NETWORKS = (SLOW, FAST)
+
+# Request headers the negotiation depends on, added to the `Vary` header
+HINT_HEADERS = ("Save-Data", "ECT")
+
+# Client hints only sent by the browsers which are asked for them, unlike
+# `Save-Data`, with the `Accept-CH` response header
+ACCEPT_CH = "ECT"
+
+# Effective connection types, as defined by the Network Information API
+_SLOW_ECT = frozenset(("slow-2g", "2g", "3g"))
+_FAST_ECT = frozenset(("4g",))
+
+
+def network_class(headers: Headers) -> str | None:
+    """
+    Return the class of the network of the client, `SLOW` when it asks to
+    save data or its connection is 3G or slower, `FAST` when its connection
+    is 4G or faster, and `None` when it sends no hint.
+
+    >>> network_class(Headers({"Save-Data": "on", "ECT": "4g"}))
+    'slow'
+    >>> network_class(Headers({"ECT": "4g"}))
+    'fast'
+    """
+    if headers.get("Save-Data", "").strip().lower() == "on":
+        return SLOW
+    ect = headers.get("ECT", "").strip().lower()
+    if ect in _SLOW_ECT:
+        return SLOW
+    if ect in _FAST_ECT:
+        return FAST
+    return None
+
+
+def prefer(algorithms: tuple[str, ...], preferred: tuple[str, ...]) -> tuple[str, ...]:
+    """
+    Order `algorithms` as in `preferred`, the other ones coming last.
+
+    >>> prefer(("zstd", "br", "gzip"), ("br", "gzip"))
+    ('br', 'gzip', 'zstd')
+    """
+    rank = {algorithm: i for i, algorithm in enumerate(preferred)}
+    return tuple(sorted(algorithms, key=lambda a: rank.get(a, len(rank))))
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from flask.wrappers import Response
+
+
+def _dumps(provider: JSONProvider) -> Callable[[Any], str]:
+    """
+    Return the function serializing a record with `provider`, with a single
+    encoder for the default provider, which creates one per call otherwise.
+    """
+    if type(provider) is DefaultJSONProvider:
+        return json.JSONEncoder(
+            default=provider.default,
+            ensure_ascii=provider.ensure_ascii,
+            sort_keys=provider.sort_keys,
+        ).encode
+    return provider.dumps
+
+
+def _blocks(
+    records: Iterable[Any], provider: JSONProvider, block_size: int
+) -> Iterator[bytes]:
+    dumps = _dumps(provider)
+    parts = ["["]
+    size = 1
+    separator = ""
+    for record in records:
+        part = dumps(record)
+        parts.append(separator)
+        parts.append(part)
+        separator = ","
+        size += len(part) + 1
+        if size >= block_size:
+            yield "".join(parts).encode()
+            parts.clear()
+            size = 0
+    parts.append("]")
+    yield "".join(parts).encode()
+
+
+def stream_json(
+    records: Iterable[Any],
+    status: int | None = None,
+    headers: Any = None,
+    block_size: int = 65536,
+) -> Response:
+    """
+    Return a streamed response of the JSON array of `records`, serialized one
+    record at a time with the JSON provider of the application.
+
+    Unlike :func:`flask.jsonify`, the whole document is never held in memory:
+    the records are serialized in blocks of about `block_size` characters,
+    which are compressed as they are produced, like any streamed response.
+
+    `records` is iterated after the view returns, outside of the request
+    context, unless it is wrapped with :func:`flask.stream_with_context`.
+
+    :param records: list or generator of the records
+    :param status: status code of the response
+    :param headers: headers of the response
+    :param block_size: size of the blocks passed to the compressor
+    """
+    provider = current_app.json
+    return current_app.response_class(
+        _blocks(records, provider, block_size),
+        status=status,
+        headers=headers,
+        mimetype=getattr(provider, "mimetype", "application/json"),
+    )
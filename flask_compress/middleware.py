@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import copy
+import itertools
+import re
+from collections.abc import Iterable, Iterator, Mapping
+from typing import TYPE_CHECKING, Any
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import quote_etag, unquote_etag
+from werkzeug.wsgi import ClosingIterator
+
+from .codecs import load_codecs
+from .flask_compress import (
+    _DEFAULTS,
+    _choose_algorithm,
+    _compress_chunks,
+    _format,
+    _vary_accept_encoding,
+)
+
+if TYPE_CHECKING:
+    from _typeshed.wsgi import StartResponse, WSGIApplication, WSGIEnvironment
+
+
+class CompressMiddleware:
+    """
+    WSGI middleware compressing the responses of any WSGI application.
+
+    It relies on the same negotiation and codecs as :class:`Compress`, so it
+    can be used for applications mounted with
+    :class:`werkzeug.middleware.dispatcher.DispatcherMiddleware` or for
+    non-Flask WSGI applications. Responses which are not compressed are
+    passed through untouched, compressed responses are produced chunk by chunk
+    without buffering the body.
+
+    :param app: the WSGI application to wrap
+    :param config: optional mapping of ``COMPRESS_*`` options, missing options
+        use the same defaults as :class:`Compress`
+    """
+
+    def __init__(
+        self, app: WSGIApplication, config: Mapping[str, Any] | None = None
+    ) -> None:
+        self.app = app
+        self.config = {k: copy.copy(v) for k, v in _DEFAULTS}
+        self.config.update(config or {})
+
+        self.compress_mimetypes_set = set(self.config["COMPRESS_MIMETYPES"])
+        self.enabled_algorithms = _format(self.config["COMPRESS_ALGORITHM"])
+        self.streaming_algorithms = _format(self.config["COMPRESS_ALGORITHM_STREAMING"])
+        algorithms = {*self.enabled_algorithms, *self.streaming_algorithms}
+        load_codecs(algorithms)
+        # Suffix added to the ETags of the compressed responses
+        suffixes = "|".join(re.escape(algorithm) for algorithm in algorithms)
+        self._etag_suffix = re.compile(f':(?:{suffixes})"')
+
+    def __call__(
+        self, environ: WSGIEnvironment, start_response: StartResponse
+    ) -> Iterable[bytes]:
+        accept_encoding = environ.get("HTTP_ACCEPT_ENCODING", "")
+        # Responses to HEAD requests have no body to compress
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            accept_encoding = ""
+        # The application validates the ETags of its uncompressed responses
+        for name in ("HTTP_IF_NONE_MATCH", "HTTP_IF_MATCH"):
+            if name in environ:
+                environ = {**environ, name: self._etag_suffix.sub('"', environ[name])}
+        algorithm: str | None = None
+        started = False
+        written: list[bytes] = []
+
+        def _start_response(
+            status: str, headers: list[tuple[str, str]], exc_info: Any = None
+        ) -> Any:
+            nonlocal algorithm, started
+            started = True
+            algorithm, headers = self._process_headers(status, headers, accept_encoding)
+            write = start_response(status, headers, exc_info)
+            if algorithm is None:
+                return write
+            # Data passed to the legacy `write` callable is compressed
+            # together with the returned iterable.
+            return written.append
+
+        app_iter = self.app(environ, _start_response)
+
+        if not started:
+            # The application calls `start_response` lazily, on first iteration.
+            def _deferred() -> Iterator[bytes]:
+                iterator = iter(app_iter)
+                first = next(iterator, None)
+                chunks = itertools.chain(
+                    written, () if first is None else (first,), iterator
+                )
+                if algorithm is None:
+                    yield from chunks
+                else:
+                    yield from _compress_chunks(self.config, chunks, algorithm)
+
+            return ClosingIterator(_deferred(), getattr(app_iter, "close", None))
+
+        if algorithm is None:
+            return app_iter
+
+        chunks = itertools.chain(written, app_iter)
+        return ClosingIterator(
+            _compress_chunks(self.config, chunks, algorithm),
+            getattr(app_iter, "close", None),
+        )
+
+    def _process_headers(
+        self, status: str, headers: list[tuple[str, str]], accept_encoding: str
+    ) -> tuple[str | None, list[tuple[str, str]]]:
+        response_headers = Headers(headers)
+
+        content_type = response_headers.get("Content-Type", "")
+        mimetype = content_type.split(";")[0].strip().lower()
+        if mimetype not in self.compress_mimetypes_set:
+            return None, headers
+
+        _vary_accept_encoding(response_headers)
+
+        status_code = int(status.split(None, 1)[0])
+        content_length = response_headers.get("Content-Length", type=int)
+        is_streamed = content_length is None
+        algorithms = (
+            self.streaming_algorithms if is_streamed else self.enabled_algorithms
+        )
+        chosen_algorithm = _choose_algorithm(algorithms, accept_encoding)
+
+        if (
+            chosen_algorithm is None
+            or status_code < 200
+            or status_code >= 300
+            or status_code == 204
+            or (is_streamed and not self.config["COMPRESS_STREAMS"])
+            or "Content-Encoding" in response_headers
+            or (
+                content_length is not None
+                and content_length < self.config["COMPRESS_MIN_SIZE"]
+            )
+        ):
+            return None, response_headers.to_wsgi_list()
+
+        response_headers["Content-Encoding"] = chosen_algorithm
+        response_headers.pop("Content-Length", None)
+
+        etag, is_weak = unquote_etag(response_headers.get("ETag"))
+        if etag and not is_weak:
+            response_headers["ETag"] = quote_etag(f"{etag}:{chosen_algorithm}")
+
+        return chosen_algorithm, response_headers.to_wsgi_list()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any, Union
+
+logger = logging.getLogger("flask_compress")
+
+# Request header enabling the profiling of a request, guarded by a token
+PROFILE_HEADER = "X-Compress-Profile"
+
+
+def _is_tracing() -> bool:
+    # Imported only with `COMPRESS_PROFILE_TRACEMALLOC`
+    import tracemalloc
+
+    return tracemalloc.is_tracing()
+
+
+class _NullProfile:
+    """Profile of a request which is not profiled, doing nothing."""
+
+    _context = contextlib.nullcontext()
+
+    def stage(self, name: str) -> contextlib.AbstractContextManager[None]:
+        return self._context
+
+    def finish(self) -> None:
+        pass
+
+
+NULL_PROFILE = _NullProfile()
+
+
+class _RequestProfile:
+    """Profile of a request, timing the stages of the compression."""
+
+    def __init__(self, profiler: Profiler, trace: bool) -> None:
+        self.profiler = profiler
+        self.trace = trace
+        self.stages: dict[str, float] = {}
+        if trace:
+            import tracemalloc
+
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def finish(self) -> None:
+        peak = None
+        if self.trace:
+            import tracemalloc
+
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.profiler._trace_lock.release()
+        self.profiler.add(self.stages, peak)
+
+
+Profile = Union[_RequestProfile, _NullProfile]
+
+
+class Profiler:
+    """
+    Aggregate the time spent in each stage of the compression, and the peak
+    of allocated memory for a sampled fraction of the profiled requests.
+
+    Every `interval` profiled requests, the aggregated results are passed to
+    `callback`, or logged by the `flask_compress` logger if there is none.
+
+    :param interval: number of profiled requests per report
+    :param tracemalloc_rate: fraction of the profiled requests whose memory
+        allocations are traced, which slows them down
+    :param callback: function receiving the reports
+    """
+
+    def __init__(
+        self,
+        interval: int,
+        tracemalloc_rate: float,
+        callback: Callable[[dict[str, Any]], None] | None,
+    ) -> None:
+        self.interval = interval
+        self.tracemalloc_rate = tracemalloc_rate
+        self.callback = callback
+        self._lock = threading.Lock()
+        # Only one request at a time is traced, as tracing is process-wide
+        self._trace_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._requests = 0
+        self._totals: dict[str, float] = {}
+        self._maximums: dict[str, float] = {}
+        self._peak: int | None = None
+
+    def begin(self, enabled: bool) -> Profile:
+        """Start the profile of a request, if `enabled`."""
+        if not enabled:
+            return NULL_PROFILE
+        trace = (
+            self.tracemalloc_rate > 0
+            and random.random() < self.tracemalloc_rate
+            and not _is_tracing()
+            and self._trace_lock.acquire(blocking=False)
+        )
+        return _RequestProfile(self, trace)
+
+    def add(self, stages: dict[str, float], peak: int | None) -> None:
+        with self._lock:
+            self._requests += 1
+            for name, elapsed in stages.items():
+                self._totals[name] = self._totals.get(name, 0.0) + elapsed
+                self._maximums[name] = max(self._maximums.get(name, 0.0), elapsed)
+            if peak is not None:
+                self._peak = max(self._peak or 0, peak)
+            if self._requests < self.interval:
+                return
+            report = self._report()
+            self._reset()
+        self._emit(report)
+
+    def flush(self) -> None:
+        """Report the results aggregated so far, if any."""
+        with self._lock:
+            if not self._requests:
+                return
+            report = self._report()
+            self._reset()
+        self._emit(report)
+
+    def _report(self) -> dict[str, Any]:
+        return {
+            "requests": self._requests,
+            "stages": {
+                name: {
+                    "total_ms": total * 1000,
+                    "mean_ms": total * 1000 / self._requests,
+                    "max_ms": self._maximums[name] * 1000,
+                }
+                for name, total in self._totals.items()
+            },
+            "tracemalloc_peak": self._peak,
+        }
+
+    def _emit(self, report: dict[str, Any]) -> None:
+        if self.callback is not None:
+            self.callback(report)
+            return
+        stages = ", ".join(
+            f"{name} {stats['mean_ms']:.3f} ms"
+            for name, stats in report["stages"].items()
+        )
+        logger.info(
+            "Compression profile of %d requests, mean time per stage: %s, "
+            "peak traced memory: %s bytes",
+            report["requests"],
+            stages,
+            report["tracemalloc_peak"],
+        )
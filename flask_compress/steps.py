@@ -0,0 +1,74 @@
+"""
+Cache I/O shared by the synchronous and asynchronous code paths.
+
+Code reading and writing a cache backend is written once, as a generator
+yielding the operations on the backend, ``("get", key)``,
+``("get_many", keys)``, ``("set", key, value)`` or ``("read_tokens",)`` of
+the tagged caches, and sent their results.
+:func:`run` performs them on a :class:`CacheBackend`, and :func:`async_run`
+awaits them on an :class:`AsyncCacheBackend`.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from typing import TYPE_CHECKING, Any, TypeVar, cast
+
+if TYPE_CHECKING:
+    from .flask_compress import AsyncCacheBackend, CacheBackend
+
+T = TypeVar("T")
+
+# Name of the method of the backend, followed by its arguments
+CacheOp = tuple[Any, ...]
+
+Steps = Generator[CacheOp, Any, T]
+
+
+def run(cache: CacheBackend | None, steps: Steps[T]) -> T:
+    """Run `steps`, performing their operations on `cache`."""
+    send: Callable[[Any], CacheOp] = steps.send
+    value: Any = None
+    while True:
+        try:
+            op = send(value)
+        except StopIteration as stop:
+            return cast(T, stop.value)
+        assert cache is not None
+        try:
+            send, value = steps.send, _perform(cache, op)
+        except Exception as exc:
+            # Raised where the operation was yielded
+            send, value = steps.throw, exc
+
+
+async def async_run(cache: AsyncCacheBackend | None, steps: Steps[T]) -> T:
+    """Same as :func:`run`, awaiting the operations on `cache`."""
+    send: Callable[[Any], CacheOp] = steps.send
+    value: Any = None
+    while True:
+        try:
+            op = send(value)
+        except StopIteration as stop:
+            return cast(T, stop.value)
+        assert cache is not None
+        try:
+            send, value = steps.send, await _async_perform(cache, op)
+        except Exception as exc:
+            send, value = steps.throw, exc
+
+
+def _perform(cache: CacheBackend, op: CacheOp) -> Any:
+    name, *args = op
+    if name == "get_many" and not hasattr(cache, "get_many"):
+        return [cache.get(key) for key in args[0]]
+    return getattr(cache, name)(*args)
+
+
+async def _async_perform(cache: AsyncCacheBackend, op: CacheOp) -> Any:
+    name, *args = op
+    if name == "get_many" and not hasattr(cache, "get_many"):
+        import asyncio
+
+        return await asyncio.gather(*(cache.get(key) for key in args[0]))
+    return await getattr(cache, name)(*args)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import secrets
+from collections.abc import Iterable, Mapping, Sequence
+from typing import TYPE_CHECKING
+
+from .steps import Steps, async_run, run
+
+if TYPE_CHECKING:
+    from .flask_compress import AsyncCacheBackend, CacheBackend
+
+# Tag of every entry, invalidating the whole cache
+ALL = "*"
+
+# Prefix of the cache keys of the tokens of the tags
+TAG_PREFIX = "tag;"
+
+
+def endpoint_tag(endpoint: str) -> str:
+    """Return the tag of the entries of the responses of `endpoint`."""
+    return f"endpoint:{endpoint}"
+
+
+def tag_key(tag: str) -> str:
+    """Return the cache key of the current token of `tag`."""
+    return TAG_PREFIX + tag
+
+
+def new_token() -> bytes:
+    return secrets.token_hex(8).encode()
+
+
+def _dump_entry(tokens: Mapping[str, str], value: bytes) -> bytes:
+    return json.dumps(tokens, separators=(",", ":")).encode() + b"\n" + value
+
+
+def _load_entry(entry: bytes) -> tuple[dict[str, str], bytes] | None:
+    """Split an entry into its tokens and value, or `None` if it is not tagged."""
+    header, _, value = entry.partition(b"\n")
+    try:
+        tokens = json.loads(header)
+    except ValueError:
+        return None
+    if not isinstance(tokens, dict):
+        return None
+    return tokens, value
+
+
+def _is_current(tokens: Mapping[str, str], current: Sequence[bytes | None]) -> bool:
+    return all(
+        token is not None and token.decode() == tokens[tag]
+        for tag, token in zip(tokens, current)
+    )
+
+
+class _TaggedEntries:
+    """Entries stored along with the tokens of their tags."""
+
+    def __init__(
+        self, tags: Iterable[str], tokens: dict[str, str] | None = None
+    ) -> None:
+        self.tags = tuple(tags)
+        self.tokens = {} if tokens is None else tokens
+
+    def _read_tokens(self) -> Steps[dict[str, str]]:
+        missing = [tag for tag in self.tags if tag not in self.tokens]
+        if missing:
+            current = yield ("get_many", [tag_key(tag) for tag in missing])
+            for tag, token in zip(missing, current):
+                if token is None:
+                    token = new_token()
+                    yield ("set", tag_key(tag), token)
+                self.tokens[tag] = token.decode()
+        return {tag: self.tokens[tag] for tag in self.tags}
+
+    def _get(self, key: str) -> Steps[bytes | None]:
+        entry = yield ("get", key)
+        loaded = None if entry is None else _load_entry(entry)
+        if loaded is None:
+            return None
+        tokens, value = loaded
+        current = yield ("get_many", [tag_key(tag) for tag in tokens])
+        return value if _is_current(tokens, current) else None
+
+    def _set(self, key: str, value: bytes) -> Steps[bool | None]:
+        tokens = yield from self._read_tokens()
+        result: bool | None = yield ("set", key, _dump_entry(tokens, value))
+        return result
+
+
+class TaggedCache(_TaggedEntries):
+    """
+    Wrap a :class:`CacheBackend` with `COMPRESS_CACHE_TAGS`.
+
+    Entries are stored along with the current token of each of their tags,
+    itself stored in the backend, and are misses once the token of one of
+    their tags has changed. Invalidating a tag therefore only replaces its
+    token, whatever the number of its entries, and is seen by every worker
+    sharing the backend. A token evicted from the backend invalidates its
+    entries too, rather than reviving entries invalidated before.
+
+    Entries are stored with the tokens read by :meth:`read_tokens`, which
+    should happen before their content is produced, so that an invalidation
+    racing with it drops them.
+
+    :param cache: the wrapped backend
+    :param tags: tags of the entries stored with :meth:`set`
+    :param tokens: tokens of the tags read so far, shared by the caches of a
+        request
+    """
+
+    def __init__(
+        self,
+        cache: CacheBackend,
+        tags: Iterable[str] = (),
+        tokens: dict[str, str] | None = None,
+    ) -> None:
+        super().__init__(tags, tokens)
+        self.cache = cache
+
+    def read_tokens(self) -> dict[str, str]:
+        """Read the tokens of the tags not read yet, and return all of them."""
+        return run(self.cache, self._read_tokens())
+
+    def get(self, key: str) -> bytes | None:
+        return run(self.cache, self._get(key))
+
+    def set(self, key: str, value: bytes) -> bool | None:
+        return run(self.cache, self._set(key, value))
+
+
+class AsyncTaggedCache(_TaggedEntries):
+    """Same as :class:`TaggedCache`, for an :class:`AsyncCacheBackend`."""
+
+    def __init__(
+        self,
+        cache: AsyncCacheBackend,
+        tags: Iterable[str] = (),
+        tokens: dict[str, str] | None = None,
+    ) -> None:
+        super().__init__(tags, tokens)
+        self.cache = cache
+
+    async def read_tokens(self) -> dict[str, str]:
+        return await async_run(self.cache, self._read_tokens())
+
+    async def get(self, key: str) -> bytes | None:
+        return await async_run(self.cache, self._get(key))
+
+    async def set(self, key: str, value: bytes) -> bool | None:
+        return await async_run(self.cache, self._set(key, value))
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+from types import ModuleType
+from typing import Any, Protocol
+
+
+class Span(Protocol):
+    """The subset of the OpenTelemetry span used by Flask-Compress."""
+
+    def set_attribute(self, key: str, value: Any) -> None: ...
+    def end(self) -> None: ...
+
+
+class _NullSpan:
+    """Span doing nothing, when tracing is disabled."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+@functools.lru_cache(maxsize=None)
+def _trace() -> ModuleType | None:
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    module: ModuleType = trace
+    return module
+
+
+class Tracer:
+    """
+    Emit the OpenTelemetry spans of the compression, as children of the span
+    of the request, or null spans when the OpenTelemetry API is missing.
+
+    :param enabled: whether to emit spans
+    :param tracer_provider: provider of the tracer, defaults to the global one
+    """
+
+    _null_context = contextlib.nullcontext(NULL_SPAN)
+
+    def __init__(self, enabled: bool, tracer_provider: Any = None) -> None:
+        trace = _trace() if enabled else None
+        self._tracer = None
+        if trace is not None:
+            self._tracer = trace.get_tracer(
+                "flask_compress", tracer_provider=tracer_provider
+            )
+
+    def span(self, name: str) -> contextlib.AbstractContextManager[Span]:
+        """Start a span, current until the end of the block."""
+        if self._tracer is None:
+            return self._null_context
+        context: contextlib.AbstractContextManager[Span]
+        context = self._tracer.start_as_current_span(name)
+        return context
+
+    def start(self, name: str) -> Span:
+        """Start a span, which is not current, to be ended by the caller."""
+        if self._tracer is None:
+            return NULL_SPAN
+        span: Span = self._tracer.start_span(name)
+        return span
@@ -15,7 +15,7 @@ setup(
     ),
     long_description=LONG_DESCRIPTION,
     long_description_content_type="text/markdown",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["benchmarks", "tests"]),
     package_data={"flask_compress": ["py.typed"]},
     include_package_data=True,
     platforms="any",
@@ -26,6 +26,11 @@ setup(
         "brotlicffi; platform_python_implementation=='PyPy'",
         "backports.zstd; python_version<'3.14'",
     ],
+    extras_require={
+        "isal": ["isal"],
+        "opentelemetry": ["opentelemetry-api"],
+        "zlib-ng": ["zlib-ng"],
+    },
     setup_requires=[
         "setuptools_scm",
     ],